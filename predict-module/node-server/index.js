@@ -34,6 +34,20 @@ async function setup() {
       timestamp BIGINT NOT NULL
     )
   `);
+  // Wakes predict-api (LISTEN gas_history) as soon as a block is stored
+  await client.query(`
+    CREATE OR REPLACE FUNCTION notify_gas_history() RETURNS trigger AS $$
+    BEGIN
+      PERFORM pg_notify('gas_history', NEW.block_number::text);
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+  `);
+  await client.query('DROP TRIGGER IF EXISTS gas_history_notify ON gas_history');
+  await client.query(`
+    CREATE TRIGGER gas_history_notify AFTER INSERT ON gas_history
+    FOR EACH ROW EXECUTE FUNCTION notify_gas_history()
+  `);
   client.release();
 }
 
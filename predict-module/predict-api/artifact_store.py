@@ -0,0 +1,161 @@
+import os
+import json
+import math
+import uuid
+import shutil
+from datetime import datetime
+
+import numpy as np
+import torch
+
+ARTIFACT_RETENTION = int(os.getenv("ARTIFACT_RETENTION", 5))
+MANIFEST = "manifest.json"
+WEIGHTS = "weights.pt"
+TMP_PREFIX = ".tmp-"
+
+
+def version_key(version):
+    # YYYYmmdd_HHMMSS with an optional _<n> suffix for versions published in the same second
+    timestamp, _, n = version[:15], version[15:16], version[16:]
+    return timestamp, int(n) if n.isdigit() else 1
+
+
+class MinMaxParams:
+    """Fitted MinMax scaling as plain arrays: x_scaled = x * scale_ + min_.
+
+    Stands in for a fitted sklearn MinMaxScaler wherever the code only transforms, so serving
+    does not need the estimator or pickle.
+    """
+
+    FIELDS = ("min_", "scale_", "data_min_", "data_max_", "data_range_")
+
+    def __init__(self, min_, scale_, data_min_, data_max_, data_range_):
+        self.min_ = np.asarray(min_)
+        self.scale_ = np.asarray(scale_)
+        self.data_min_ = np.asarray(data_min_)
+        self.data_max_ = np.asarray(data_max_)
+        self.data_range_ = np.asarray(data_range_)
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        return cls(*(getattr(scaler, field) for field in cls.FIELDS))
+
+    @classmethod
+    def from_array(cls, array):
+        return cls(*array)
+
+    def to_array(self):
+        return np.stack([getattr(self, field) for field in self.FIELDS]).astype(np.float64)
+
+    def transform(self, X):
+        return np.asarray(X) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X) - self.min_) / self.scale_
+
+
+def finite(value):
+    # NaN/inf metrics (e.g. an rmse that could not be computed) as null: manifest.json stays
+    # strict JSON, which the API returns as is
+    if isinstance(value, dict):
+        return {key: finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class ArtifactStore:
+    """Versioned model artifacts under root/<version>/, one directory per training run.
+
+    A version is written into a hidden temporary directory and published with a single
+    rename, so readers only ever see complete versions. Old versions are pruned down to
+    ``retention``, which is at least 1 so the version just published always stays.
+    """
+
+    def __init__(self, root, retention=ARTIFACT_RETENTION):
+        self.root = root
+        self.retention = max(1, retention)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((name for name in os.listdir(self.root)
+                       if not name.startswith(".") and os.path.exists(os.path.join(self.root, name, MANIFEST))),
+                      key=version_key)
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def path(self, version, name=""):
+        return os.path.join(self.root, version, name)
+
+    def manifest(self, version):
+        with open(self.path(version, MANIFEST)) as f:
+            return json.load(f)
+
+    def _new_version(self):
+        # Strictly newer than every published version, even within the same second
+        version = datetime.now().strftime("%Y%m%d_%H%M%S")
+        latest = self.latest()
+        candidate, n = version, 1
+        while latest is not None and version_key(candidate) <= version_key(latest):
+            n += 1
+            candidate = f"{version}_{n}"
+        return candidate
+
+    def publish(self, write, manifest):
+        """write(tmp_dir) stores the artifact files; returns the published version name."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            write(tmp_dir)
+            version = self._new_version()
+            manifest = {"version": version, "created_at": datetime.utcnow().isoformat(), **manifest,
+                        "files": sorted(os.listdir(tmp_dir)) + [MANIFEST]}
+            with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+                json.dump(finite(manifest), f, indent=2, allow_nan=False)
+            os.rename(tmp_dir, self.path(version))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.prune()
+        return version
+
+    def prune(self, keep=()):
+        for version in self.versions()[:-self.retention]:
+            if version not in keep:
+                shutil.rmtree(self.path(version), ignore_errors=True)
+        # Leftovers of writers that died before publishing
+        for name in os.listdir(self.root):
+            if name.startswith(TMP_PREFIX) and not self._recent(os.path.join(self.root, name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    @staticmethod
+    def _recent(path, max_age_s=3600):
+        try:
+            return datetime.now().timestamp() - os.path.getmtime(path) < max_age_s
+        except OSError:
+            return False
+
+
+def save_torch_weights(tmp_dir, model, name=WEIGHTS):
+    state = {key: value.detach().cpu().contiguous() for key, value in model.state_dict().items()}
+    torch.save(state, os.path.join(tmp_dir, name))
+
+
+def load_torch_weights(version_dir, device="cpu", name=WEIGHTS):
+    # torch's zip format can be memory-mapped, so only the pages actually read are loaded
+    return torch.load(os.path.join(version_dir, name), map_location=device, mmap=True, weights_only=True)
+
+
+def save_scalers(tmp_dir, **scalers):
+    for name, scaler in scalers.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), MinMaxParams.from_scaler(scaler).to_array())
+
+
+def load_scaler(version_dir, name):
+    return MinMaxParams.from_array(np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode="r"))
@@ -0,0 +1,330 @@
+"""Walk-forward backtests of the multivariate LSTM and the per-target MLP/RF/LSTM over the local
+history file.
+
+The history after the first `train_rows` rows is cut into consecutive test folds. Each fold is
+scored by models trained on the `train_rows` rows just before it ("retrain"), or by the
+published models ("published"). The folds run in parallel, one spawned worker each. A worker
+memory-maps the history file and copies only its own rows. Every fold does the same bounded
+amount of work, so a backtest takes time linear in the history length.
+
+Reported per horizon:
+- Multivariate: RMSE/MAE of every origin's rollout, scored as /predict/next_n_steps would serve
+  it. Step s is stamped s - 1 minutes after the origin block; its actual price is that of the
+  first block after that time.
+- Per target: the next-block error.
+- Both against the persistence baseline (the origin's price).
+- Top-k: how well the k cheapest predicted steps pick the really cheap steps of each
+  trajectory.
+
+Run from predict-api/:
+    python -m backtest [--history history] [--mode retrain] [--fold-rows 5000]
+                       [--train-rows 20000] [--folds 4] [--json out.json]
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from model_utils import (MULTIVARIATE_TARGETS, MULTIVARIATE_FEATURES, MULTIVARIATE_CONTEXT, add_time_features,
+                         score_models, train_model_for_target_and_type, train_multivariate)
+from history_file import HistoryFile, HISTORY_FILE, CALENDAR_COLUMNS, calendar_columns
+from rollups import Rollups, context_blocks
+from rollout import RolloutEngine
+from windowing import sliding_windows
+from artifact_store import ArtifactStore
+from orchestrator import limit_threads
+
+MODEL_DIR = "saved_models"
+BACKTEST_MODELS = ['multivariate', 'mlp', 'random_forest', 'lstm']
+# Rollout steps the multivariate errors are reported at
+BACKTEST_HORIZONS = [1, 5, 15, 30, 60]
+# Trajectory length and picks of the top-k evaluation, like /predict/next_n_steps?n_steps=60
+BACKTEST_STEPS = 60
+BACKTEST_TOP_K = 5
+# Origins rolled out per forward pass
+BACKTEST_BATCH = 1024
+
+
+def plan_folds(rows, fold_rows, train_rows, n_folds=None):
+    """(train_start, test_start, test_end) row ranges of consecutive test folds after the first
+    train_rows rows, each trained on the train_rows rows before it; the last n_folds if given."""
+    folds = [(start - train_rows, start, start + fold_rows)
+             for start in range(train_rows, rows - fold_rows + 1, fold_rows)]
+    return folds[-n_folds:] if n_folds else folds
+
+
+def fold_models(config, train):
+    """{"multivariate": {...}, target: {...}} for the fold: trained on train, or the published ones."""
+    models = {}
+    per_target = [model_type for model_type in config["models"] if model_type != 'multivariate']
+    if config["mode"] == "retrain":
+        if 'multivariate' in config["models"]:
+            res = train_multivariate(train, epochs=config["epochs"])
+            models['multivariate'] = {key: res[key] for key in ('model', 'scaler_x', 'scaler_y', 'window', 'context')}
+        for target in MULTIVARIATE_TARGETS if per_target else []:
+            trained = {model_type: train_model_for_target_and_type(train, target, model_type, n_jobs=config["threads"],
+                                                                   epochs=config["epochs"])
+                       for model_type in per_target}
+            models[target] = {
+                "models": {model_type: res['model'] for model_type, res in trained.items()},
+                "scalers": {model_type: (res['scaler_x'], res['scaler_y']) for model_type, res in trained.items()
+                            if res['scaler_x'] is not None},
+                "window": 10,
+            }
+        return models
+
+    from model_registry import load_version
+    from ensemble import TargetModels
+    store = ArtifactStore(os.path.join(config["root"], "multivariate"))
+    if 'multivariate' in config["models"] and store.latest() is not None:
+        model, scaler_x, scaler_y, manifest = load_version(store, store.latest())
+        models['multivariate'] = {"model": model, "scaler_x": scaler_x, "scaler_y": scaler_y,
+                                  "window": manifest.get("window", 10), "context": manifest.get("context"),
+                                  "last_block": manifest.get("last_block")}
+    for target in MULTIVARIATE_TARGETS if per_target else []:
+        store = ArtifactStore(os.path.join(config["root"], target))
+        if store.latest() is not None:
+            target_models = TargetModels(store, store.latest())
+            models[target] = {
+                "models": {m: target_models.models[m] for m in per_target if m in target_models.models},
+                "scalers": target_models.scalers,
+                "window": target_models.window,
+            }
+    return models
+
+
+def score_multivariate(entry, features, timestamps, prices, origins, horizons, steps, top_k):
+    """Error sums per horizon and top-k sums of the multivariate rollouts from every origin."""
+    window, context = entry["window"], entry.get("context")
+    windows = sliding_windows(features, window)[origins - window + 1]
+    if context:
+        rollups = Rollups(minutes=None, hours=None)
+        rollups.append(timestamps, prices)
+        windows = np.concatenate([rollups.context(timestamps[origins], **context), windows], axis=1)
+    n_steps = max(max(horizons), steps)
+    # Calendar of the rows fed back after each step, as RolloutEngine.forecast builds it
+    step_times = timestamps[origins, np.newaxis] + 60 * np.arange(n_steps)
+    calendar = calendar_columns(step_times[:, 1:])
+    calendar = np.stack([calendar[col] for col in CALENDAR_COLUMNS], axis=-1).astype(np.float32)
+
+    engine = RolloutEngine(entry["model"], entry["scaler_x"], entry["scaler_y"], "eager")
+    preds = np.concatenate([engine.rollout(windows[i:i + BACKTEST_BATCH], calendar[i:i + BACKTEST_BATCH])
+                            for i in range(0, len(origins), BACKTEST_BATCH)])
+    actual_rows = np.searchsorted(timestamps, step_times, side="right")
+    valid = actual_rows < len(timestamps)
+    # float64 so the sums stay exact over millions of origins
+    actual = prices[np.minimum(actual_rows, len(timestamps) - 1)].astype(np.float64)
+    persistence = prices[origins, np.newaxis].astype(np.float64)
+
+    h = np.asarray(horizons) - 1
+    mask = valid[:, h, np.newaxis]
+    errors, naive = (preds[:, h] - actual[:, h]) * mask, (persistence - actual[:, h]) * mask
+    sums = {
+        "n": mask[..., 0].sum(0),
+        "sq": (errors ** 2).sum(0), "abs": np.abs(errors).sum(0),
+        "persistence_sq": (naive ** 2).sum(0), "persistence_abs": np.abs(naive).sum(0),
+    }
+
+    # Top-k on the medium price over trajectories whose steps all have an actual block
+    complete = valid[:, :steps].all(axis=1)
+    predicted, realized = preds[complete, :steps, 1], actual[complete, :steps, 1]
+    picked = np.argsort(predicted, axis=1, kind="stable")[:, :top_k]
+    best = np.argsort(realized, axis=1, kind="stable")[:, :top_k]
+    picked_price = np.take_along_axis(realized, picked, axis=1).mean(axis=1)
+    best_price = np.take_along_axis(realized, best, axis=1).mean(axis=1)
+    mean_price = realized.mean(axis=1)
+    is_best = np.zeros(realized.shape, dtype=bool)
+    np.put_along_axis(is_best, best, True, axis=1)
+    sums["top_k"] = {
+        "n": int(complete.sum()),
+        "hits": float(np.take_along_axis(is_best, picked, axis=1).sum()),
+        "saved": float((mean_price - picked_price).sum()),
+        "best_saved": float((mean_price - best_price).sum()),
+        "regret": float((picked_price - best_price).sum()),
+    }
+    return sums
+
+
+def score_target(entry, features, prices, origins, column):
+    """Next-block error sums of one target's models, and of persistence."""
+    window = entry["window"]
+    origins = origins[origins + 1 < len(prices)]
+    actual = prices[origins + 1, column].astype(np.float64)
+    preds = score_models(entry["models"], entry["scalers"], sliding_windows(features, window)[origins - window + 1])
+    preds["persistence"] = prices[origins, column]
+    return {model_type: {"n": len(origins), "sq": float(((values - actual) ** 2).sum()),
+                         "abs": float(np.abs(values - actual).sum())}
+            for model_type, values in preds.items()}
+
+
+def _run_fold(config, fold):
+    # Runs in a worker process: map the history file, copy this fold's rows, train, score
+    limit_threads(config["threads"])
+    started = time.perf_counter()
+    train_start, test_start, test_end = fold
+    columns = HistoryFile(config["path"]).columns()
+    timestamps = columns['timestamp']
+    # The rows before the first origin its window and context need, and the blocks after the
+    # last origin that its trajectory is scored against
+    lead = context_blocks(config["context"]) + config["window"]
+    first = max(min(train_start, test_start - lead), 0)
+    last = int(np.searchsorted(timestamps, int(timestamps[test_end - 1]) + 60 * config["n_steps"], side="right")) + 1
+    frame = pd.DataFrame({name: np.asarray(column[first:last]) for name, column in columns.items()})
+
+    models = fold_models(config, frame.iloc[train_start - first:test_start - first].reset_index(drop=True))
+    features = add_time_features(frame)[MULTIVARIATE_FEATURES].to_numpy(np.float32)
+    prices = frame[MULTIVARIATE_TARGETS].to_numpy(np.float32)
+    frame_timestamps = frame['timestamp'].to_numpy(np.int64)
+    origins = np.arange(test_start - first, test_end - first, config["stride"])
+    origins = origins[origins >= lead - 1]
+
+    result = {"fold": {"train_blocks": [int(frame['block_number'].iloc[train_start - first]),
+                                        int(frame['block_number'].iloc[test_start - first - 1])],
+                       "test_blocks": [int(frame['block_number'].iloc[test_start - first]),
+                                       int(frame['block_number'].iloc[test_end - first - 1])],
+                       "origins": len(origins)}}
+    if 'multivariate' in models:
+        entry = models['multivariate']
+        result["multivariate"] = score_multivariate(entry, features, frame_timestamps, prices, origins,
+                                                    config["horizons"], config["steps"], config["top_k"])
+        if entry.get("last_block") is not None:
+            # Published models may have been trained on this fold
+            result["fold"]["in_sample"] = entry["last_block"] >= result["fold"]["test_blocks"][0]
+    for column, target in enumerate(MULTIVARIATE_TARGETS):
+        if target in models:
+            result[target] = score_target(models[target], features, prices, origins, column)
+    result["fold"]["seconds"] = round(time.perf_counter() - started, 3)
+    return fold, result
+
+
+def merge(total, part):
+    # Sums of two fold results, key by key
+    if isinstance(part, dict):
+        return {key: merge(total.get(key), value) if total else value for key, value in part.items()}
+    return part if total is None else total + part
+
+
+def _errors(n, sq, abs_sum, columns=None):
+    n = np.maximum(np.asarray(n, dtype=np.float64), 1)
+    rmse, mae = np.sqrt(np.asarray(sq) / n), np.asarray(abs_sum) / n
+    if columns is None:
+        return {"rmse": round(float(rmse), 4), "mae": round(float(mae), 4)}
+    return {"rmse": dict(zip(columns, np.round(rmse, 4).tolist())), "mae": dict(zip(columns, np.round(mae, 4).tolist()))}
+
+
+def summarize(sums, config):
+    """Error metrics from summed fold results."""
+    summary = {}
+    if "multivariate" in sums:
+        mv = sums["multivariate"]
+        summary["multivariate"] = {
+            "horizons": [{"steps": steps, "n": int(mv["n"][i]),
+                          **_errors(mv["n"][i, np.newaxis], mv["sq"][i], mv["abs"][i], MULTIVARIATE_TARGETS),
+                          "persistence": _errors(mv["n"][i, np.newaxis], mv["persistence_sq"][i],
+                                                 mv["persistence_abs"][i], MULTIVARIATE_TARGETS)}
+                         for i, steps in enumerate(config["horizons"])],
+        }
+        top = mv["top_k"]
+        n = max(top["n"], 1)
+        summary["multivariate"]["top_k"] = {
+            "k": config["top_k"], "steps": config["steps"], "origins": top["n"],
+            # Share of picked steps that are among the k really cheapest
+            "hit_rate": round(top["hits"] / (n * config["top_k"]), 4),
+            # Saving over the trajectory's mean price, as a share of the best possible saving
+            "savings_captured": round(top["saved"] / top["best_saved"], 4) if top["best_saved"] else None,
+            # Mean price paid above the k cheapest steps
+            "regret": round(top["regret"] / n, 4),
+        }
+    for target in MULTIVARIATE_TARGETS:
+        if target in sums:
+            summary[target] = {model_type: {"n": int(s["n"]), **_errors(s["n"], s["sq"], s["abs"])}
+                               for model_type, s in sums[target].items()}
+    return summary
+
+
+def run_backtest(path=HISTORY_FILE, mode="retrain", models=BACKTEST_MODELS, fold_rows=5000, train_rows=20000,
+                 n_folds=None, horizons=BACKTEST_HORIZONS, steps=BACKTEST_STEPS, top_k=BACKTEST_TOP_K, stride=1,
+                 epochs=10, workers=0, root=MODEL_DIR):
+    """Walk-forward backtest over the history file at path; see the module docstring."""
+    started = time.perf_counter()
+    rows = len(HistoryFile(path))
+    folds = plan_folds(rows, fold_rows, train_rows, n_folds)
+    if not folds:
+        raise ValueError(f"{rows} rows of history in {path!r}, {train_rows + fold_rows} needed for one fold")
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, len(folds))
+    config = {
+        "path": path, "mode": mode, "models": list(models), "root": root, "epochs": epochs,
+        "horizons": sorted(horizons), "steps": steps, "top_k": top_k, "stride": stride,
+        "n_steps": max(max(horizons), steps), "threads": max(1, cpus // workers),
+        # Largest input any model needs in front of an origin
+        "window": 10, "context": {"hours": 0, "minutes": 0},
+    }
+    if 'multivariate' in models:
+        # Published models record their input; retrained ones get the training defaults
+        store = ArtifactStore(os.path.join(root, "multivariate"))
+        manifest = store.manifest(store.latest()) if mode == "published" and store.latest() else {}
+        config["window"] = manifest.get("window", 10)
+        config["context"] = manifest.get("context", MULTIVARIATE_CONTEXT) or config["context"]
+
+    total, per_fold = None, []
+    # spawn: forking a process that already runs torch/BLAS threads is not safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_run_fold, config, fold) for fold in folds]
+        for future in as_completed(futures):
+            fold, result = future.result()
+            info = result.pop("fold")
+            per_fold.append({**info, **summarize(result, config)})
+            total = merge(total, result)
+            print(f"Backtested blocks {info['test_blocks'][0]}-{info['test_blocks'][1]} "
+                  f"({info['origins']} origins) in {info['seconds']}s")
+    per_fold.sort(key=lambda info: info["test_blocks"][0])
+    seconds = time.perf_counter() - started
+    return {
+        "mode": mode, "rows": rows, "folds": len(folds), "fold_rows": fold_rows, "train_rows": train_rows,
+        "workers": workers, "seconds": round(seconds, 3), **summarize(total, config), "per_fold": per_fold,
+    }
+
+
+def print_report(report):
+    print(f"{report['folds']} folds of {report['fold_rows']} blocks ({report['mode']}), "
+          f"{report['seconds']}s on {report['workers']} workers")
+    if "multivariate" in report:
+        print("multivariate        steps   rmse low/medium/high          persistence")
+        for row in report["multivariate"]["horizons"]:
+            rmse, naive = row["rmse"], row["persistence"]["rmse"]
+            print(f"{'':20s}{row['steps']:5d}   " + "/".join(f"{rmse[t]:.3f}" for t in MULTIVARIATE_TARGETS)
+                  + "   " + "/".join(f"{naive[t]:.3f}" for t in MULTIVARIATE_TARGETS))
+        print(f"top-k               {report['multivariate']['top_k']}")
+    for target in MULTIVARIATE_TARGETS:
+        if target in report:
+            print(f"{target:20s}" + "  ".join(f"{model_type} {s['rmse']:.3f}" for model_type, s in report[target].items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", default=HISTORY_FILE, help="history file directory (see history_file.py)")
+    parser.add_argument("--mode", default="retrain", choices=["retrain", "published"])
+    parser.add_argument("--models", nargs="+", default=BACKTEST_MODELS, choices=BACKTEST_MODELS)
+    parser.add_argument("--fold-rows", type=int, default=5000)
+    parser.add_argument("--train-rows", type=int, default=20000, help="rows each fold is trained on")
+    parser.add_argument("--folds", type=int, help="only the last n folds")
+    parser.add_argument("--horizons", type=int, nargs="+", default=BACKTEST_HORIZONS)
+    parser.add_argument("--steps", type=int, default=BACKTEST_STEPS)
+    parser.add_argument("--top-k", type=int, default=BACKTEST_TOP_K)
+    parser.add_argument("--stride", type=int, default=1, help="score every n-th block of each fold")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per core, capped by the fold count")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    report = run_backtest(args.history, args.mode, args.models, args.fold_rows, args.train_rows, args.folds,
+                          args.horizons, args.steps, args.top_k, args.stride, args.epochs, args.workers)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
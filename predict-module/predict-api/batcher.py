@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+from collections import defaultdict
+
+import numpy as np
+
+from rollout import PRICE_FEATURES, calendar_features
+from telemetry import STAGE_SECONDS
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+# 0 only batches requests that queued up while the previous batch ran, so a lone request
+# never waits; a few ms trades single-request latency for larger batches
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 0))
+
+
+class _Request:
+    def __init__(self, engine, key, window, start, n_steps):
+        self.engine = engine
+        self.key = key
+        self.window = np.asarray(window, dtype=np.float32)
+        self.start = start
+        self.n_steps = n_steps
+        self.waiters = []
+        self.queued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    """Collects concurrent rollout requests and runs them as one batched forward pass.
+
+    Requests with the same key (same model, window and start time, so the same trajectory)
+    collapse into one batch row rolled out to the longest horizon asked for. Requests are
+    grouped by engine and window length, since only those can share a batch.
+    """
+
+    def __init__(self, max_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._pending = {}
+        self._worker = None
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.rows = 0
+
+    async def forecast(self, engine, key, window, start, n_steps):
+        """(n_steps, 3) prices rolled out from window, the first one stamped start."""
+        if n_steps == 0:
+            return np.empty((0, PRICE_FEATURES), dtype=np.float32)
+        self._ensure_worker()
+        self.requests += 1
+        future = asyncio.get_running_loop().create_future()
+        request = self._pending.get((engine, key))
+        if request is not None:
+            self.deduplicated += 1
+            request.n_steps = max(request.n_steps, n_steps)
+        else:
+            request = _Request(engine, key, window, start, n_steps)
+            self._pending[(engine, key)] = request
+            self._queue.put_nowait(request)
+        request.waiters.append((future, n_steps))
+        return await future
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._pending = {}
+            self._worker = asyncio.create_task(self._run())
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # From here on new requests start a new batch instead of joining this one
+        queue_wait = STAGE_SECONDS.labels("batch_queue")
+        for request in batch:
+            self._pending.pop((request.engine, request.key), None)
+            queue_wait.observe(time.perf_counter() - request.queued_at)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            groups = defaultdict(list)
+            for request in batch:
+                groups[(request.engine, request.window.shape)].append(request)
+            for (engine, _), requests in groups.items():
+                try:
+                    results = await asyncio.to_thread(self._rollout, engine, requests)
+                except Exception as e:
+                    results = [e] * len(requests)
+                self.batches += 1
+                self.rows += len(requests)
+                for request, preds in zip(requests, results):
+                    for future, n_steps in request.waiters:
+                        if future.done():
+                            continue
+                        if isinstance(preds, Exception):
+                            future.set_exception(preds)
+                        else:
+                            future.set_result(preds[:n_steps])
+
+    @staticmethod
+    def _rollout(engine, requests):
+        n_steps = max(request.n_steps for request in requests)
+        windows = np.stack([request.window for request in requests])
+        # Rows of shorter requests are padded; their extra steps are computed and dropped
+        calendar = np.zeros((len(requests), n_steps - 1, windows.shape[2] - PRICE_FEATURES), dtype=np.float32)
+        for i, request in enumerate(requests):
+            _, request_calendar = calendar_features(request.start, request.n_steps)
+            calendar[i, :request.n_steps - 1] = request_calendar[1:]
+        preds = engine.rollout(windows, calendar)
+        return [preds[i, :request.n_steps] for i, request in enumerate(requests)]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+            "mean_batch_size": round(self.rows / self.batches, 3) if self.batches else None,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+
+batcher = InferenceBatcher()
@@ -0,0 +1,98 @@
+"""Throughput of concurrent forecast requests, one rollout per request vs InferenceBatcher.
+
+Run from predict-api/:  python -m benchmarks.bench_batcher [--clients 1 8 64] [--steps 1 60]
+                        [--distinct 0.5] [--backend onnx]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+from model_utils import MultivariateLSTM, device
+from rollout import RolloutEngine
+from batcher import InferenceBatcher
+from inference import BACKENDS, INFERENCE_BACKEND
+from benchmarks.bench_rollout import FEATURE_COLS, synthetic_features
+
+
+async def unbatched(engine, requests):
+    # What the handlers did before: every request rolls out on its own in the threadpool
+    return await asyncio.gather(*(asyncio.to_thread(engine.forecast, window, start, n) for _, window, start, n in requests))
+
+
+async def batched(batcher, engine, requests):
+    return await asyncio.gather(*(batcher.forecast(engine, key, window, start, n) for key, window, start, n in requests))
+
+
+def make_requests(features, timestamps, clients, n_steps, distinct, window=10):
+    # distinct = fraction of clients asking for a different block; the rest repeat one
+    n_distinct = max(1, int(clients * distinct))
+    requests = []
+    for i in range(clients):
+        end = len(features) - (i % n_distinct)
+        requests.append((end, features[end - window:end], timestamps[end - 1], n_steps))
+    return requests
+
+
+def run(clients_list, steps, distinct, repeat=5, backend=INFERENCE_BACKEND):
+    df = synthetic_features(5000)
+    features = df[FEATURE_COLS].values
+    scaler_x = MinMaxScaler().fit(features)
+    scaler_y = MinMaxScaler().fit(features[:, :3])
+    model = MultivariateLSTM(input_size=9, hidden_size=300).to(device).eval()
+    engine = RolloutEngine(model, scaler_x, scaler_y, backend)
+    timestamps = df['timestamp'].tolist()
+
+    results = []
+    for clients in clients_list:
+        for n_steps in steps:
+            requests = make_requests(features, timestamps, clients, n_steps, distinct)
+            batcher = InferenceBatcher()
+
+            async def measure():
+                best_single = best_batched = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    expected = [preds for _, preds in await unbatched(engine, requests)]
+                    best_single = min(best_single, time.perf_counter() - start)
+                    start = time.perf_counter()
+                    actual = await batched(batcher, engine, requests)
+                    best_batched = min(best_batched, time.perf_counter() - start)
+                error = max(float(np.max(np.abs(a - e))) for a, e in zip(actual, expected))
+                await batcher.close()
+                return best_single, best_batched, error
+
+            single, batch, error = asyncio.run(measure())
+            results.append({
+                "clients": clients,
+                "n_steps": n_steps,
+                "distinct": distinct,
+                "backend": engine.backend["name"],
+                "unbatched_req_per_s": clients / single,
+                "batched_req_per_s": clients / batch,
+                "speedup": single / batch,
+                "max_abs_error": error,
+                **batcher.stats(),
+            })
+            print(f"clients={clients:4d} steps={n_steps:4d}  unbatched {results[-1]['unbatched_req_per_s']:8.0f} req/s"
+                  f"  batched {results[-1]['batched_req_per_s']:8.0f} req/s  x{results[-1]['speedup']:.1f}"
+                  f"  mean batch {results[-1]['mean_batch_size']}  max err {error:.1e}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 60])
+    parser.add_argument("--distinct", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=BACKENDS)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    results = run(args.clients, args.steps, args.distinct, args.repeat, args.backend)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
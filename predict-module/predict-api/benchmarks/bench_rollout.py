@@ -0,0 +1,125 @@
+"""Per-step cost of the multi-step forecast, legacy sliding-window loop vs RolloutEngine.
+
+Run from predict-api/:  python -m benchmarks.bench_rollout [--steps 60 600] [--windows 10 1000]
+                        [--backends eager torchscript onnx quantized] [--samples 64 256]
+
+--samples also times RolloutEngine.sample, all trajectories in one batch, against rolling
+the same number of single forecasts one after the other.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.preprocessing import MinMaxScaler
+
+from model_utils import MultivariateLSTM, add_time_features, device
+from rollout import RolloutEngine
+from inference import BACKENDS
+
+FEATURE_COLS = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
+                'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
+
+
+def synthetic_features(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    medium = 10 + np.abs(np.cumsum(rng.normal(0, 0.2, rows)))
+    df = pd.DataFrame({
+        'low_gas_price': medium * 0.8,
+        'medium_gas_price': medium,
+        'high_gas_price': medium * 1.3,
+        'timestamp': 1_750_000_000 + 12 * np.arange(rows),
+    })
+    return add_time_features(df)
+
+
+def legacy_rollout(model, scaler_x, scaler_y, input_seq, last_timestamp, n_steps):
+    # The loop /predict/now and /predict/next_n_steps used before RolloutEngine
+    current_seq = torch.tensor(scaler_x.transform(input_seq), dtype=torch.float32).unsqueeze(0).to(device)
+    preds = []
+    for step in range(1, n_steps + 1):
+        with torch.no_grad():
+            output_scaled = model(current_seq)
+        pred_gas = scaler_y.inverse_transform(output_scaled.cpu().numpy()).reshape(-1)[:3]
+        preds.append(pred_gas)
+        next_time = last_timestamp + timedelta(minutes=step)
+        next_features = np.array([pred_gas[0], pred_gas[1], pred_gas[2], next_time.hour, next_time.minute,
+                                  next_time.weekday(), next_time.day, next_time.month, next_time.year]).reshape(1, 9)
+        next_features_tensor = torch.tensor(scaler_x.transform(next_features).reshape(1, 1, 9),
+                                            dtype=torch.float32).to(device)
+        current_seq = torch.cat([current_seq[:, 1:, :], next_features_tensor], dim=1)
+    return np.array(preds)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(steps, windows, repeat=3, hidden_size=300, backends=("eager",), samples=()):
+    df = synthetic_features(max(windows) + 1000)
+    features = df[FEATURE_COLS].values
+    scaler_x = MinMaxScaler().fit(features)
+    scaler_y = MinMaxScaler().fit(features[:, :3])
+    model = MultivariateLSTM(input_size=9, hidden_size=hidden_size).to(device)
+    model.eval()
+    engines = {backend: RolloutEngine(model, scaler_x, scaler_y, backend) for backend in backends}
+    last_timestamp = df['timestamp'].iloc[-1]
+
+    results = []
+    for window in windows:
+        input_seq = features[-window:]
+        for n_steps in steps:
+            legacy = timed(lambda: legacy_rollout(model, scaler_x, scaler_y, input_seq, last_timestamp, n_steps), repeat)
+            for backend, engine in engines.items():
+                stateful = timed(lambda: engine.forecast(input_seq, last_timestamp, n_steps), repeat)
+                results.append({
+                    "window": window,
+                    "n_steps": n_steps,
+                    "backend": engine.backend["name"],
+                    "max_error": engine.backend.get("max_error", 0.0),
+                    "legacy_ms_per_step": 1000 * legacy / n_steps,
+                    "rollout_ms_per_step": 1000 * stateful / n_steps,
+                    "speedup": legacy / stateful,
+                })
+                print(f"window={window:5d} steps={n_steps:4d}  legacy {results[-1]['legacy_ms_per_step']:.3f} ms/step"
+                      f"  {backend:>11} {results[-1]['rollout_ms_per_step']:.3f} ms/step  x{results[-1]['speedup']:.1f}")
+                for n_samples in samples:
+                    sampled = timed(lambda: engine.sample(input_seq, last_timestamp, n_steps, n_samples, [0.05] * 3),
+                                    repeat)
+                    results.append({
+                        "window": window,
+                        "n_steps": n_steps,
+                        "backend": engine.backend["name"],
+                        "samples": n_samples,
+                        "sample_ms": 1000 * sampled,
+                        # One batched pass vs n_samples forecasts in a row
+                        "cost_vs_one_forecast": sampled / stateful,
+                        "speedup": n_samples * stateful / sampled,
+                    })
+                    print(f"window={window:5d} steps={n_steps:4d}  {backend:>11} {n_samples:5d} samples"
+                          f" {results[-1]['sample_ms']:.1f} ms  = {results[-1]['cost_vs_one_forecast']:.1f} forecasts"
+                          f"  x{results[-1]['speedup']:.1f} vs sequential")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, nargs="+", default=[60, 600])
+    parser.add_argument("--windows", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["eager"], choices=BACKENDS)
+    parser.add_argument("--samples", type=int, nargs="*", default=[], help="trajectory counts to time sampling for")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    results = run(args.steps, args.windows, args.repeat, backends=args.backends, samples=args.samples)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,110 @@
+"""Worker cold start: importing main, then startup up to the first /predict/gasfee answer.
+
+Every run is a fresh interpreter, as for a new worker. The parent publishes an untrained
+model and writes the history file once, in a temporary directory; each child times
+``import main``, builds the SQLite stand-in (not timed), then times the app's startup, the
+moment it accepts requests and its first prediction.
+
+Run from predict-api/:  python -m benchmarks.bench_startup [--rows 100000] [--repeat 3]
+                        [--warmup background blocking] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+HISTORY_PATH = "history"
+
+
+def child(rows, eager_imports):
+    started = time.perf_counter()
+    if eager_imports:
+        # What importing main cost while model_utils imported the training libraries
+        import joblib, sklearn.ensemble, sklearn.metrics, sklearn.neural_network  # noqa: F401, E401
+    import main
+    imported = time.perf_counter() - started
+
+    from fastapi.testclient import TestClient
+    from benchmarks.synthetic import generate_gas_history
+    from benchmarks.sqlite_db import SQLiteGasHistory
+    db = SQLiteGasHistory(generate_gas_history(rows))
+    with db.install(history_path=HISTORY_PATH):
+        started = time.perf_counter()
+        with TestClient(main.app) as client:
+            accepting = time.perf_counter() - started
+            response = client.get("/predict/gasfee")
+            first_prediction = time.perf_counter() - started
+            assert response.status_code == 200, response.text
+            # "ready" would include the SQLite setup above; import is timed here instead
+            phases = {phase: seconds for phase, seconds in client.get("/startup").json()["seconds"].items()
+                      if phase not in ("import", "ready")}
+    return {
+        "import_s": imported,
+        "accepting_s": accepting,
+        "first_prediction_s": first_prediction,
+        # From the first import to the first answer, as a client of a new worker sees it
+        "time_to_first_prediction_s": imported + first_prediction,
+        "phases": phases,
+        "modules": sorted(m for m in ("sklearn", "joblib", "scipy") if m in sys.modules),
+    }
+
+
+def prepare(workdir, rows):
+    # Imported here, not at module level, so --child runs start from a cold interpreter
+    import model_utils
+    from benchmarks.synthetic import generate_gas_history
+    from benchmarks.sqlite_db import SQLiteGasHistory
+    from benchmarks.bench_suite import publish_model
+
+    os.chdir(workdir)
+    df = generate_gas_history(rows)
+    with SQLiteGasHistory(df).install(history_path=HISTORY_PATH):
+        model_utils.load_data()
+        publish_model(df)
+
+
+def run(rows, repeat, warmups, eager):
+    source = os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare(workdir, rows)
+        scenarios = [(warmup, False) for warmup in warmups] + ([(warmups[0], True)] if eager else [])
+        for warmup, eager_imports in scenarios:
+            env = dict(os.environ, PYTHONPATH=source, STARTUP_WARMUP=warmup)
+            runs = []
+            for _ in range(repeat):
+                command = [sys.executable, "-m", "benchmarks.bench_startup", "--child", "--rows", str(rows)]
+                output = subprocess.run(command + (["--eager-imports"] if eager_imports else []), cwd=workdir,
+                                        env=env, capture_output=True, text=True, check=True).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            best = min(runs, key=lambda r: r["time_to_first_prediction_s"])
+            results.append({"warmup": warmup, "eager_imports": eager_imports, "rows": rows, **best})
+            print(f"warmup={warmup:10s} eager_imports={eager_imports!s:5s}  import {best['import_s']:.2f}s"
+                  f"  accepting +{best['accepting_s']:.2f}s  first prediction +{best['first_prediction_s']:.2f}s"
+                  f"  -> {best['time_to_first_prediction_s']:.2f}s  phases {best['phases']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000, help="gas_history rows")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per scenario; the best is kept")
+    parser.add_argument("--warmup", nargs="+", default=["background", "blocking"],
+                        choices=["background", "blocking"])
+    parser.add_argument("--no-eager", action="store_true",
+                        help="skip the run that imports the training libraries up front for comparison")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager-imports", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.rows, args.eager_imports)))
+        sys.exit()
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = run(args.rows, args.repeat, args.warmup, not args.no_eager)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,263 @@
+"""Microbenchmarks of the data/feature/inference hot paths and end-to-end load tests of the
+predict endpoints, on synthetic gas_history served from SQLite instead of Postgres.
+
+Run from predict-api/, after pip install -r requirements-dev.txt (httpx, scipy):
+    python -m benchmarks.bench_suite [--sizes 10000 100000 1000000] [--horizons 1 60 600]
+                                     [--clients 1 16] [--suites micro e2e train backtest] [--json out.json]
+
+Models and artifacts are written to a temporary directory; nothing touches saved_models/.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import torch
+import httpx
+from sklearn.preprocessing import MinMaxScaler
+
+import model_utils
+from model_utils import (MultivariateLSTM, MULTIVARIATE_FEATURES, MULTIVARIATE_TARGETS, MULTIVARIATE_CONTEXT,
+                         add_time_features, multivariate_series, create_features_multivariate_full,
+                         rollup_context, save_multivariate, device)
+from training import split_windows
+from history_store import HistoryStore, history
+from history_file import HistoryFile, HISTORY_COLUMNS
+from model_registry import registry
+from inference import INFERENCE_BACKEND
+import forecasting
+import main
+from benchmarks.synthetic import generate_gas_history, next_blocks
+from benchmarks.sqlite_db import SQLiteGasHistory
+
+
+def summarize(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        "best_ms": float(samples.min()),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "samples": len(samples),
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(results, suite, name, rows, samples, **params):
+    result = {"suite": suite, "name": name, "rows": rows, **params, **summarize(samples)}
+    results.append(result)
+    extra = " ".join(f"{key}={value}" for key, value in params.items())
+    print(f"[{suite}] rows={rows:<9d} {name:<34} {extra:<24} best {result['best_ms']:10.3f} ms"
+          f"  p50 {result['p50_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms")
+    return result
+
+
+def publish_model(df):
+    # Untrained weights are enough to time inference; scalers are fitted on the synthetic data
+    features = add_time_features(df.iloc[-10000:])
+    model = MultivariateLSTM(input_size=len(MULTIVARIATE_FEATURES), hidden_size=300).to(device).eval()
+    res = {
+        "model": model,
+        "scaler_x": MinMaxScaler().fit(features[MULTIVARIATE_FEATURES].values),
+        "scaler_y": MinMaxScaler().fit(features[MULTIVARIATE_TARGETS].values),
+        "rmse": None,
+        "last_block": int(df["block_number"].iloc[-1]),
+        "context": MULTIVARIATE_CONTEXT,
+        "mode": "benchmark",
+    }
+    save_multivariate(res)
+    return registry.reload()
+
+
+def run_micro(results, df, rows, horizons, repeat):
+    report(results, "micro", "generate_gas_history", rows, timed(lambda: generate_gas_history(rows), repeat))
+    report(results, "micro", "load_data", rows, timed(model_utils.load_data, repeat))
+    report(results, "micro", "load_data (database)", rows, timed(model_utils._load_all, repeat))
+    report(results, "micro", "HistoryFile.append (cold)", rows,
+           timed(lambda: HistoryFile(tempfile.mkdtemp(dir=".")).append(df), repeat))
+    report(results, "micro", "HistoryFile.frame", rows, timed(lambda: model_utils.history_file.frame(), repeat))
+    print(f"[micro] bytes/row: database frame + calendar "
+          f"{add_time_features(df[HISTORY_COLUMNS]).memory_usage(index=False).sum() / rows:.1f}, "
+          f"history file frame {model_utils.history_file.frame().memory_usage(index=False).sum() / rows:.1f}")
+    report(results, "micro", "add_time_features", rows, timed(lambda: add_time_features(df), repeat))
+    report(results, "micro", "multivariate_series", rows,
+           timed(lambda: multivariate_series(df, "medium_gas_price"), repeat))
+    report(results, "micro", "create_features_multivariate_full", rows,
+           timed(lambda: create_features_multivariate_full(df, MULTIVARIATE_FEATURES, MULTIVARIATE_TARGETS), repeat))
+
+    data, target = multivariate_series(df, MULTIVARIATE_TARGETS)
+    train_set, _ = split_windows(data, target, window=10)
+    indices = np.random.default_rng(0).integers(0, len(train_set), 256).tolist()
+    report(results, "micro", "WindowDataset.__getitems__", rows,
+           timed(lambda: train_set.__getitems__(indices), repeat * 10), batch=256)
+    scaler_x = MinMaxScaler().fit(data)
+    report(results, "micro", "rollup_context (build)", rows,
+           timed(lambda: rollup_context(add_time_features(df), scaler_x, MULTIVARIATE_CONTEXT), repeat))
+    context_set, _ = split_windows(data, target, window=10,
+                                   context=rollup_context(add_time_features(df), scaler_x, MULTIVARIATE_CONTEXT))
+    report(results, "micro", "ContextWindowDataset.__getitems__", rows,
+           timed(lambda: context_set.__getitems__(indices), repeat * 10), batch=256)
+
+    report(results, "micro", "HistoryStore.refresh (cold)", rows,
+           timed(lambda: HistoryStore().refresh(force=True), repeat))
+    store = HistoryStore()
+    store.refresh(force=True)
+    report(results, "micro", "HistoryStore.frame", rows,
+           timed(lambda: store.frame(forecasting.NEXT_STEP_WINDOW), repeat * 10), window=forecasting.NEXT_STEP_WINDOW)
+
+    frame = store.frame(forecasting.NEXT_STEP_WINDOW)
+    report(results, "micro", "feature_window", rows,
+           timed(lambda: forecasting.feature_window(frame, forecasting.NEXT_STEP_WINDOW), repeat * 10),
+           window=forecasting.NEXT_STEP_WINDOW)
+    last_time = frame['timestamp'].iloc[-1]
+    report(results, "micro", "Rollups.context", rows,
+           timed(lambda: store.rollups.context(last_time, **MULTIVARIATE_CONTEXT), repeat * 10))
+    active = registry.get()
+    blocks, last_timestamp, _ = forecasting.feature_window(frame, forecasting.NEXT_STEP_WINDOW)
+    # Recent blocks alone, and behind the rollup context the benchmark model is published with
+    inputs = {"blocks": blocks,
+              "context": np.concatenate([store.rollups.context(last_time, **MULTIVARIATE_CONTEXT), blocks])}
+    for name, features in inputs.items():
+        for n_steps in horizons:
+            report(results, "micro", "RolloutEngine.forecast", rows,
+                   timed(lambda: active.engine.forecast(features, last_timestamp, n_steps), repeat),
+                   input=name, input_rows=len(features), n_steps=n_steps)
+
+
+async def run_e2e(results, db, rows, horizons, clients_list, rounds):
+    endpoints = [("/predict/gasfee", {}), ("/predict/now", {})]
+    endpoints += [("/predict/next_n_steps", {"n_steps": n}) for n in horizons]
+    await main.start_background_tasks()
+    tail = db.read_frame("SELECT * FROM gas_history ORDER BY block_number DESC LIMIT 1")
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path, params in endpoints:
+                for clients in clients_list:
+                    # hot: same block every round (cache hits); new_block: one new block per round,
+                    # so each round recomputes once and concurrent clients share it
+                    for mode in ("hot", "new_block"):
+                        latencies, elapsed = [], 0.0
+                        for _ in range(rounds):
+                            if mode == "new_block":
+                                tail = next_blocks(tail, 1)
+                                db.append(tail)
+                                await history.wait_for_block(int(tail["block_number"].iloc[-1]) - 1, timeout=5)
+
+                            async def request():
+                                start = time.perf_counter()
+                                response = await client.get(path, params=params)
+                                response.raise_for_status()
+                                latencies.append(time.perf_counter() - start)
+
+                            start = time.perf_counter()
+                            await asyncio.gather(*(request() for _ in range(clients)))
+                            elapsed += time.perf_counter() - start
+                        result = report(results, "e2e", path, rows, latencies, clients=clients, mode=mode,
+                                        **params)
+                        result["req_per_s"] = len(latencies) / elapsed
+    finally:
+        await main.stop_background_tasks()
+
+
+def run_train(results, rows):
+    report(results, "train", "train_models", rows, timed(model_utils.train_models, 1))
+
+
+def run_backtest_suite(results, rows, stride=10):
+    # Published model, so only scoring is timed; should grow linearly with rows
+    from backtest import run_backtest
+    model_utils.load_data()
+    fold_rows = min(50_000, rows // 4)
+    samples = timed(lambda: run_backtest(model_utils.history_file.path, "published", ["multivariate"],
+                                         fold_rows=fold_rows, train_rows=fold_rows, stride=stride), 1)
+    result = report(results, "backtest", "run_backtest (published)", rows, samples, stride=stride)
+    result["rows_per_s"] = rows / samples[0]
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "inference_backend": INFERENCE_BACKEND,
+        "args": vars(args),
+    }
+
+
+async def run(args):
+    results = []
+    start_block = 20_000_000
+    for rows in args.sizes:
+        # Each size continues the block numbers of the previous one, so the shared history
+        # store sees it as new blocks
+        start = time.perf_counter()
+        df = generate_gas_history(rows, seed=args.seed, start_block=start_block)
+        start_block += rows
+        db = SQLiteGasHistory(df)
+        print(f"--- {rows} rows (generated and loaded into SQLite in {time.perf_counter() - start:.1f}s)")
+        with db.install(history_path=f"history_{rows}"):
+            publish_model(df)
+            if "micro" in args.suites:
+                run_micro(results, df, rows, args.horizons, args.repeat)
+            if "e2e" in args.suites:
+                await run_e2e(results, db, rows, args.horizons, args.clients, args.rounds)
+            if "train" in args.suites and rows <= args.train_max_rows:
+                run_train(results, rows)
+            if "backtest" in args.suites:
+                run_backtest_suite(results, rows)
+        db.close()
+        del df
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="gas_history rows, e.g. 10000 ... 10000000")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[1, 60, 600])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--suites", nargs="+", default=["micro", "e2e"], choices=["micro", "e2e", "train", "backtest"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=10, help="request bursts per e2e scenario")
+    parser.add_argument("--train-max-rows", type=int, default=100_000,
+                        help="only run the train suite for sizes up to this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    meta = metadata(args)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results = asyncio.run(run(args))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
@@ -0,0 +1,98 @@
+"""SQLite stand-in for the Postgres ``gas_history`` table.
+
+``install()`` swaps it in for the readers in ``db``/``model_utils``/``history_store`` so the
+data loaders, the history refresher and the endpoints run unchanged without Postgres, along
+with a history file of its own (or none).
+"""
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+import db
+import model_utils
+import history_store
+from history_file import HistoryFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+  block_number INTEGER PRIMARY KEY,
+  low_gas_price REAL NOT NULL,
+  medium_gas_price REAL NOT NULL,
+  high_gas_price REAL NOT NULL,
+  timestamp INTEGER NOT NULL
+)
+"""
+
+
+class SQLiteGasHistory:
+    def __init__(self, df=None, path=":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._listeners = []
+        with self._lock:
+            self._conn.execute(SCHEMA.format(table="gas_history"))
+        if df is not None:
+            self.append(df, notify=False)
+
+    def append(self, df, notify=True, table="gas_history"):
+        """Insert rows (another table stands for another chain); like the ingester's trigger,
+        wakes LISTEN subscribers."""
+        with self._lock:
+            self._conn.execute(SCHEMA.format(table=table))
+            self._conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)",
+                                   df[history_store.HISTORY_COLUMNS].itertuples(index=False, name=None))
+            self._conn.commit()
+        if notify:
+            for loop, callback in self._listeners:
+                loop.call_soon_threadsafe(callback)
+
+    def read_frame(self, query, params=None, timeout_ms=None):
+        with self._lock:
+            return pd.read_sql_query(query.replace("%s", "?"), self._conn, params=params)
+
+    def read_frame_chunked(self, query, params=None, chunksize=None, timeout_ms=None):
+        return self.read_frame(query, params)
+
+    async def read_frame_async(self, query, params=None, timeout_ms=None):
+        return await asyncio.to_thread(self.read_frame, query, params)
+
+    async def listen(self, channel, callback):
+        listener = (asyncio.get_running_loop(), callback)
+        self._listeners.append(listener)
+        return listener
+
+    async def unlisten(self, channel, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @contextmanager
+    def install(self, history_path=None):
+        local = HistoryFile(history_path) if history_path else None
+        patches = [
+            (model_utils, "history_file", local),
+            (history_store, "history_file", local),
+            (db, "read_frame", self.read_frame),
+            (db, "read_frame_chunked", self.read_frame_chunked),
+            (db, "read_frame_async", self.read_frame_async),
+            (db, "listen", self.listen),
+            (db, "unlisten", self.unlisten),
+            (model_utils, "read_frame", self.read_frame),
+            (model_utils, "read_frame_chunked", self.read_frame_chunked),
+            (model_utils, "read_frame_async", self.read_frame_async),
+            (history_store, "listen", self.listen),
+            (history_store, "unlisten", self.unlisten),
+        ]
+        saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+        for module, name, value in patches:
+            setattr(module, name, value)
+        try:
+            yield self
+        finally:
+            for module, name, value in saved:
+                setattr(module, name, value)
+
+    def close(self):
+        self._conn.close()
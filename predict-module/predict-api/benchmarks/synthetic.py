@@ -0,0 +1,82 @@
+"""Synthetic ``gas_history`` rows: 12 s slots with missed slots, and prices that switch
+between calm, busy and spike regimes with a daily cycle."""
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from history_store import HISTORY_COLUMNS
+
+SLOT_SECONDS = 12
+MISSED_SLOT_RATE = 0.01
+
+# name: (median gas price in gwei, per-block log volatility, mean duration in blocks)
+REGIMES = {
+    "calm": (8.0, 0.02, 3000),
+    "busy": (25.0, 0.04, 600),
+    "spike": (120.0, 0.12, 60),
+}
+# Next regime when one ends
+TRANSITIONS = np.array([
+    [0.0, 0.9, 0.1],
+    [0.8, 0.0, 0.2],
+    [0.3, 0.7, 0.0],
+])
+MEAN_REVERSION = 0.98
+
+
+def regime_sequence(rows, rng):
+    # Vectorised Markov chain: draw whole regime runs instead of one state per block
+    levels, vols, durations = map(np.array, zip(*REGIMES.values()))
+    states, lengths, state, total = [], [], 0, 0
+    while total < rows:
+        length = int(rng.geometric(1 / durations[state]))
+        states.append(state)
+        lengths.append(length)
+        total += length
+        state = rng.choice(len(REGIMES), p=TRANSITIONS[state])
+    regime = np.repeat(states, lengths)[:rows]
+    return regime, levels[regime], vols[regime]
+
+
+def generate_gas_history(rows, seed=0, start_block=20_000_000, end_time=None):
+    """DataFrame shaped like ``gas_history`` whose last block is stamped end_time (default now)."""
+    rng = np.random.default_rng(seed)
+    gaps = SLOT_SECONDS * rng.geometric(1 - MISSED_SLOT_RATE, rows)
+    end_time = int(end_time if end_time is not None else time.time())
+    timestamps = end_time - np.cumsum(gaps[::-1])[::-1] + gaps[-1]
+
+    _, level, vol = regime_sequence(rows, rng)
+    hour = (timestamps % 86400) / 3600
+    daily = 1 + 0.3 * np.sin(2 * np.pi * (hour - 9) / 24)
+    # Mean-reverting noise around the regime level, so switches show up as ramps, not steps
+    target = np.log(level * daily)
+    log_level, _ = lfilter([1 - MEAN_REVERSION], [1, -MEAN_REVERSION], target, zi=[MEAN_REVERSION * target[0]])
+    noise = lfilter([1], [1, -MEAN_REVERSION], vol * rng.standard_normal(rows))
+    medium = np.exp(log_level + noise)
+
+    low = medium * (1 - rng.uniform(0.05, 0.25, rows))
+    high = medium * (1 + rng.uniform(0.1, 0.4, rows) * (1 + vol / 0.04))
+    return pd.DataFrame({
+        "block_number": start_block + np.arange(rows, dtype=np.int64),
+        "low_gas_price": low.round(4),
+        "medium_gas_price": medium.round(4),
+        "high_gas_price": high.round(4),
+        "timestamp": timestamps.astype(np.int64),
+    }, columns=HISTORY_COLUMNS)
+
+
+def next_blocks(df, n=1, seed=None):
+    """n more rows continuing df, one slot apart, at the last row's price level."""
+    rng = np.random.default_rng(seed)
+    last = df.iloc[-1]
+    step = rng.normal(0, 0.03, n).cumsum()
+    medium = last["medium_gas_price"] * np.exp(step)
+    return pd.DataFrame({
+        "block_number": int(last["block_number"]) + 1 + np.arange(n),
+        "low_gas_price": (medium * 0.85).round(4),
+        "medium_gas_price": medium.round(4),
+        "high_gas_price": (medium * 1.25).round(4),
+        "timestamp": int(last["timestamp"]) + SLOT_SECONDS * (1 + np.arange(n)),
+    }, columns=HISTORY_COLUMNS)
@@ -0,0 +1,183 @@
+import os
+import re
+import uuid
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from telemetry import timed
+
+# Database configuration
+DB_PARAMS = {
+    'dbname': os.getenv('POSTGRES_DB'),
+    'user': os.getenv('POSTGRES_USER'),
+    'password': os.getenv('POSTGRES_PASSWORD'),
+    'host': os.getenv('POSTGRES_HOST', 'localhost'),
+    'port': os.getenv('POSTGRES_PORT', 5432)
+}
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 4))
+DB_POOL_WAIT = float(os.getenv("DB_POOL_WAIT", 10))
+# Per-query timeouts in ms, 0 disables; training reads are large and get their own budget
+DB_QUERY_TIMEOUT_MS = int(os.getenv("DB_QUERY_TIMEOUT_MS", 5000))
+DB_TRAIN_TIMEOUT_MS = int(os.getenv("DB_TRAIN_TIMEOUT_MS", 0))
+DB_FETCH_CHUNK = int(os.getenv("DB_FETCH_CHUNK", 50000))
+# "asyncpg" for a native async pool, "threadpool" to run the psycopg2 pool in worker threads
+DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "asyncpg")
+
+# gas prices are NUMERIC columns; decode them straight to float instead of Decimal objects
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "DEC2FLOAT",
+    lambda value, cur: float(value) if value is not None else None)
+psycopg2.extensions.register_type(DEC2FLOAT)
+
+_pool = None
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_pool_lock = threading.Lock()
+_async_pool = None
+_listen_conn = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_PARAMS)
+    return _pool
+
+
+@contextmanager
+def connection(timeout_ms=DB_QUERY_TIMEOUT_MS):
+    # ThreadedConnectionPool raises as soon as it is exhausted, so callers queue on a semaphore instead
+    if not _pool_slots.acquire(timeout=DB_POOL_WAIT):
+        raise psycopg2.OperationalError("Timed out waiting for a database connection")
+    pool = get_pool()
+    conn = None
+    broken = False
+    try:
+        conn = pool.getconn()
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+            yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if conn is not None:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        _pool_slots.release()
+
+
+@timed("db_read")
+def read_frame(query, params=None, timeout_ms=DB_QUERY_TIMEOUT_MS):
+    with connection(timeout_ms) as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+    return pd.DataFrame(rows, columns=columns)
+
+
+def iter_frames(query, params=None, chunksize=DB_FETCH_CHUNK, timeout_ms=DB_TRAIN_TIMEOUT_MS):
+    # Server-side cursor: the result set stays in Postgres and is pulled chunksize rows at a time
+    with connection(timeout_ms) as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunksize
+            cur.execute(query, params)
+            columns = None
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [d[0] for d in cur.description]
+                yield pd.DataFrame(rows, columns=columns)
+
+
+@timed("db_read_chunked")
+def read_frame_chunked(query, params=None, chunksize=DB_FETCH_CHUNK, timeout_ms=DB_TRAIN_TIMEOUT_MS):
+    frames = list(iter_frames(query, params, chunksize, timeout_ms))
+    if not frames:
+        return read_frame(f"SELECT * FROM ({query}) t LIMIT 0", params, timeout_ms)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _to_dollar_params(query):
+    # psycopg2 placeholders (%s) -> asyncpg placeholders ($1, $2, ...)
+    counter = iter(range(1, query.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+
+async def _init_async_connection(conn):
+    await conn.set_type_codec("numeric", encoder=str, decoder=float, schema="pg_catalog", format="text")
+
+
+async def get_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        import asyncpg
+        _async_pool = await asyncpg.create_pool(
+            database=DB_PARAMS['dbname'], user=DB_PARAMS['user'], password=DB_PARAMS['password'],
+            host=DB_PARAMS['host'], port=int(DB_PARAMS['port']),
+            min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, init=_init_async_connection)
+    return _async_pool
+
+
+@timed("db_read_async")
+async def read_frame_async(query, params=None, timeout_ms=DB_QUERY_TIMEOUT_MS):
+    if DB_ASYNC_DRIVER != "asyncpg":
+        return await asyncio.to_thread(read_frame, query, params, timeout_ms)
+
+    pool = await get_async_pool()
+    async with pool.acquire(timeout=DB_POOL_WAIT) as conn:
+        rows = await conn.fetch(_to_dollar_params(query), *(params or ()),
+                                timeout=timeout_ms / 1000 if timeout_ms else None)
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame([tuple(r) for r in rows], columns=list(rows[0].keys()))
+
+
+async def listen(channel, callback):
+    """LISTEN on channel with a dedicated asyncpg connection; callback() runs on every NOTIFY."""
+    global _listen_conn
+    if DB_ASYNC_DRIVER != "asyncpg":
+        raise RuntimeError("LISTEN/NOTIFY needs DB_ASYNC_DRIVER=asyncpg")
+    import asyncpg
+    if _listen_conn is None:
+        _listen_conn = await asyncpg.connect(
+            database=DB_PARAMS['dbname'], user=DB_PARAMS['user'], password=DB_PARAMS['password'],
+            host=DB_PARAMS['host'], port=int(DB_PARAMS['port']))
+    listener = lambda *args: callback()
+    await _listen_conn.add_listener(channel, listener)
+    return listener
+
+
+async def unlisten(channel, listener):
+    if _listen_conn is not None and listener is not None:
+        await _listen_conn.remove_listener(channel, listener)
+
+
+async def close_async_pool():
+    global _async_pool, _listen_conn
+    if _listen_conn is not None:
+        await _listen_conn.close()
+        _listen_conn = None
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
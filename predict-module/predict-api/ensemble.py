@@ -0,0 +1,138 @@
+import os
+import math
+import threading
+
+import numpy as np
+
+from model_utils import LSTMModel, MULTIVARIATE_TARGETS, MULTIVARIATE_FEATURES, add_time_features, score_models, device
+from artifact_store import ArtifactStore, load_torch_weights, load_scaler
+from windowing import sliding_windows
+from telemetry import span
+
+MODEL_DIR = "saved_models"
+
+
+def inverse_mse_weights(rmse):
+    # Blend weights proportional to 1 / MSE on the training run's test split; models without a
+    # usable score are left out
+    scores = {model_type: 1 / max(value, 1e-12) ** 2 for model_type, value in rmse.items()
+              if value is not None and math.isfinite(value)}
+    total = sum(scores.values())
+    return {model_type: score / total for model_type, score in scores.items()} if total else {}
+
+
+class TargetModels:
+    """The MLP, random forest and LSTM published for one target, loaded once and scored on
+    batches of windows."""
+
+    def __init__(self, store, version):
+        path = store.path(version)
+        manifest = store.manifest(version)
+        self.target = manifest.get("target", os.path.basename(store.root))
+        self.version = version
+        self.window = manifest.get("window", 10)
+        self.models, self.scalers = {}, {}
+        for model_type in manifest["models"]:
+            if model_type == 'lstm':
+                state = load_torch_weights(path, device, name="lstm.pt")
+                hidden_size, input_size = state['lstm.weight_ih_l0'].shape
+                model = LSTMModel(input_size=input_size, hidden_size=hidden_size // 4).to(device)
+                model.load_state_dict(state)
+                self.models[model_type] = model.eval()
+            else:
+                # Only the ensemble endpoints unpickle sklearn estimators, so joblib loads with them
+                import joblib
+
+                # Saved uncompressed, so the forest's node arrays are memory-mapped
+                self.models[model_type] = joblib.load(os.path.join(path, f"{model_type}.joblib"), mmap_mode="r")
+            if os.path.exists(os.path.join(path, f"{model_type}_scaler_x.npy")):
+                self.scalers[model_type] = (load_scaler(path, f"{model_type}_scaler_x"),
+                                            load_scaler(path, f"{model_type}_scaler_y"))
+        self.rmse = {model_type: stats.get("rmse") for model_type, stats in manifest["models"].items()}
+        self.weights = inverse_mse_weights(self.rmse)
+
+    def predict(self, windows):
+        """(n, window, features) raw windows -> {model_type: (n,) predictions, "blend": (n,)}."""
+        with span("ensemble_predict"):
+            preds = score_models(self.models, self.scalers, windows)
+        preds["blend"] = sum(weight * preds[model_type] for model_type, weight in self.weights.items())
+        return preds
+
+    def info(self):
+        return {"version": self.version, "window": self.window, "rmse": self.rmse, "weights": self.weights}
+
+
+class Ensemble:
+    """Latest per-target model versions; each scores a whole batch of windows per model call."""
+
+    def __init__(self, root=MODEL_DIR, targets=MULTIVARIATE_TARGETS):
+        self.targets = {}
+        for target in targets:
+            store = ArtifactStore(os.path.join(root, target))
+            version = store.latest()
+            if version is not None:
+                self.targets[target] = TargetModels(store, version)
+
+    @property
+    def versions(self):
+        return {target: models.version for target, models in self.targets.items()}
+
+    @property
+    def window(self):
+        return max((models.window for models in self.targets.values()), default=10)
+
+    def predict(self, features):
+        """Per-target predictions for the row after each window of a (rows, features) series.
+
+        Row i of the result follows features[i:i+window] of the target's window; models with
+        shorter windows see the end of the same rows, so every target scores the same rows.
+        """
+        windows = sliding_windows(features, self.window)
+        return {target: models.predict(windows[:, self.window - models.window:])
+                for target, models in self.targets.items()}
+
+    def backtest(self, frame):
+        """Score every row of frame after the first `window` from the rows before it.
+
+        Returns the predicted rows' timestamps, the actual prices and the predictions.
+        """
+        df = add_time_features(frame)
+        features = df[MULTIVARIATE_FEATURES].values
+        preds = {target: {model_type: values[:-1] for model_type, values in target_preds.items()}
+                 for target, target_preds in self.predict(features).items()}
+        return df['timestamp'].iloc[self.window:], df[MULTIVARIATE_TARGETS].iloc[self.window:], preds
+
+    def info(self):
+        return {target: models.info() for target, models in self.targets.items()}
+
+
+def error_metrics(actual, preds):
+    errors = np.asarray(preds, dtype=np.float64) - np.asarray(actual, dtype=np.float64)
+    return {"rmse": float(np.sqrt(np.mean(errors ** 2))), "mae": float(np.mean(np.abs(errors)))}
+
+
+class EnsembleRegistry:
+    """Loads the per-target models on first use and again whenever a target publishes a new version."""
+
+    def __init__(self, root=MODEL_DIR):
+        self.root = root
+        self._active = None
+        self._lock = threading.Lock()
+
+    def _latest(self):
+        return {target: version for target in MULTIVARIATE_TARGETS
+                if (version := ArtifactStore(os.path.join(self.root, target)).latest()) is not None}
+
+    def get(self):
+        latest = self._latest()
+        if not latest:
+            return None
+        with self._lock:
+            if self._active is None or self._active.versions != latest:
+                with span("ensemble_load"):
+                    self._active = Ensemble(self.root)
+                print(f"Loaded ensemble {self._active.versions}")
+            return self._active
+
+
+ensemble_registry = EnsembleRegistry()
@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+FORECAST_CACHE_ENTRIES = int(os.getenv("FORECAST_CACHE_ENTRIES", 64))
+FORECAST_CACHE_MAX_STEPS = int(os.getenv("FORECAST_CACHE_MAX_STEPS", 100000))
+# Sampled trajectories get a cache of their own; its budget counts every sample of a step
+# (600 steps x 256 samples is 153600), about 12 bytes each
+SAMPLE_CACHE_ENTRIES = int(os.getenv("SAMPLE_CACHE_ENTRIES", 8))
+SAMPLE_CACHE_MAX_STEPS = int(os.getenv("SAMPLE_CACHE_MAX_STEPS", 2000000))
+
+
+def _rows(preds):
+    # Steps times samples per step (1 for point forecasts)
+    return len(preds) * int(np.prod(np.shape(preds)[1:-1]))
+
+
+class ForecastCache:
+    """LRU cache of forecast trajectories keyed by (model artifact path, last block, kind).
+
+    One trajectory serves every horizon up to its length, so a 600-step rollout also answers
+    all shorter requests for the same model and block. Concurrent misses on the same key wait
+    for the first caller instead of rolling out the same trajectory again.
+
+    max_steps bounds the rows held: one per step of a (n_steps, 3) forecast, n_samples per step
+    of a (n_steps, n_samples, 3) sampled one.
+    """
+
+    def __init__(self, max_entries=FORECAST_CACHE_ENTRIES, max_steps=FORECAST_CACHE_MAX_STEPS):
+        self.max_entries = max_entries
+        self.max_steps = max_steps
+        self._entries = OrderedDict()
+        self._steps = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, n_steps):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or len(entry[1]) < n_steps:
+                return None
+            self._entries.move_to_end(key)
+            times, preds = entry
+            return times[:n_steps], preds[:n_steps]
+
+    def put(self, key, times, preds):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._steps -= _rows(old[1])
+                if len(old[1]) > len(preds):
+                    times, preds = old
+            self._entries[key] = (times, preds)
+            self._steps += _rows(preds)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._steps > self.max_steps):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._steps -= _rows(evicted)
+
+    def record(self, hit):
+        # Hit/miss counters, for callers that do their own get/put
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_compute(self, key, n_steps, compute):
+        """compute(n_steps) -> (times, preds); only runs on a miss, once per key at a time."""
+        cached = self.get(key, n_steps)
+        if cached is not None:
+            self.record(True)
+            return cached
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                cached = self.get(key, n_steps)
+                if cached is not None:
+                    self.record(True)
+                    return cached
+                self.record(False)
+                times, preds = compute(n_steps)
+                self.put(key, times, preds)
+        finally:
+            # Callers already waiting hold the lock object; later ones find the entry, or
+            # compute again if this call raised
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+        return times[:n_steps], preds[:n_steps]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "steps": self._steps, "hits": self.hits, "misses": self.misses}
+
+
+forecast_cache = ForecastCache()
+sample_cache = ForecastCache(SAMPLE_CACHE_ENTRIES, SAMPLE_CACHE_MAX_STEPS)
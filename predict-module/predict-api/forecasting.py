@@ -0,0 +1,171 @@
+import os
+from datetime import datetime
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from model_utils import add_time_features
+from forecast_cache import forecast_cache, sample_cache
+from batcher import batcher
+from history_store import history
+from telemetry import timed
+
+FEATURE_COLS = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
+                'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
+PRICE_COLS = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
+# Recent blocks in a model input, for models that do not record their window
+NEXT_STEP_WINDOW = 10
+MAX_HORIZON = 600
+# Trajectories per probabilistic forecast, and the one-step log-price noise of models published
+# before their residual scale was recorded
+FORECAST_SAMPLES = int(os.getenv("FORECAST_SAMPLES", 256))
+MAX_SAMPLES = 2048
+FORECAST_NOISE_SCALE = float(os.getenv("FORECAST_NOISE_SCALE", 0.05))
+
+
+@timed("feature_window")
+def feature_window(frame, window):
+    # Last `window` rows of a raw history frame -> model features, last timestamp, last block
+    df = add_time_features(frame.iloc[-window:])
+    return df[FEATURE_COLS].values, df['timestamp'].iloc[-1], int(df['block_number'].iloc[-1])
+
+
+def model_window(active, frame, rollups=None):
+    """feature_window with the input size the model was trained on: its window of recent blocks,
+    behind the hourly/minute rollups of its context. The size is fixed however long the history.
+
+    rollups are those of the history store frame comes from (the default store's if None).
+    """
+    features, last_timestamp, last_block = feature_window(frame, active.metadata.get('window', NEXT_STEP_WINDOW))
+    context = active.metadata.get('context')
+    if context:
+        rollups = rollups or history.rollups
+        features = np.concatenate([rollups.context(frame['timestamp'].iloc[-1], **context), features])
+    return features, last_timestamp, last_block
+
+
+def predict_next_gas_fee(active, frame, rollups=None):
+    features, _, _ = model_window(active, frame, rollups)
+    return active.engine.predict_next(features)
+
+
+def forecast_next_steps(active, frame, n_steps, rollups=None):
+    features, last_timestamp, last_block = model_window(active, frame, rollups)
+    return forecast_cache.get_or_compute(
+        (active.model_path, last_block, "next_n_steps"), n_steps,
+        lambda n: active.engine.forecast(features, last_timestamp, n))
+
+
+def top_k_steps(times, preds, key, k=5):
+    # Cheapest k steps by one price column, as /predict/next_n_steps reports them
+    column = PRICE_COLS.index(key if key in PRICE_COLS else 'medium_gas_price')
+    order = np.argsort(preds[:, column], kind="stable")[:k]
+    return [{"step": int(i) + 1, PRICE_COLS[column]: float(preds[i, column]), "timestamp": times[i]} for i in order]
+
+
+def noise_scale(active):
+    # Prices whose residual scale could not be computed (null in the manifest) get the fallback
+    scale = active.metadata.get('residual_scale') or [None] * len(PRICE_COLS)
+    return [FORECAST_NOISE_SCALE if value is None else value for value in scale]
+
+
+def forecast_samples(active, frame, n_steps, n_samples=FORECAST_SAMPLES, rollups=None):
+    """Sampled trajectories after the last block: (timestamps, (n_steps, n_samples, 3) prices).
+
+    Seeded by the block, so every worker and every horizon sees the same samples for a block.
+    """
+    features, last_timestamp, last_block = model_window(active, frame, rollups)
+    return sample_cache.get_or_compute(
+        (active.model_path, last_block, "samples", n_samples), n_steps,
+        lambda n: active.engine.sample(features, last_timestamp, n, n_samples, noise_scale(active), seed=last_block))
+
+
+def quantile_steps(times, samples, key, quantiles, threshold=None):
+    """Per-step quantiles of one price column across samples, and the share of samples below
+    threshold at each step and at any step."""
+    values = samples[:, :, PRICE_COLS.index(key if key in PRICE_COLS else 'medium_gas_price')]
+    levels = np.quantile(values, quantiles, axis=1)
+    steps = [{"step": i + 1, "timestamp": t,
+              "quantiles": {str(q): round(float(levels[j, i]), 4) for j, q in enumerate(quantiles)}}
+             for i, t in enumerate(times)]
+    if threshold is None:
+        return steps, None
+    below = values < threshold
+    for step, p in zip(steps, below.mean(axis=1)):
+        step["p_below"] = round(float(p), 4)
+    return steps, round(float(below.any(axis=0).mean()), 4)
+
+
+def steps_until_now(active, now=None):
+    now = now or datetime.utcnow()
+    return int((now - active.trained_at).total_seconds() // 60)
+
+
+def forecast_until_now(active, frame, n_steps, rollups=None):
+    # Rolled out from the model's training time, not from the last block
+    features, _, last_block = model_window(active, frame, rollups)
+    return forecast_cache.get_or_compute(
+        (active.model_path, last_block, "now"), n_steps,
+        lambda n: active.engine.forecast(features, active.trained_at, n))
+
+
+# Async variants for the request handlers: misses go through the batcher, which merges
+# concurrent requests into one forward pass and collapses identical ones
+
+async def _cached_forecast(active, key, features, start, n_steps):
+    cached = forecast_cache.get(key, n_steps)
+    if cached is not None:
+        forecast_cache.record(True)
+        return cached
+    forecast_cache.record(False)
+    preds = await batcher.forecast(active.engine, key, features, start, n_steps)
+    times = pd.date_range(pd.Timestamp(start), periods=n_steps, freq="1min")
+    forecast_cache.put(key, times, preds)
+    return times, preds
+
+
+async def predict_next_gas_fee_async(active, frame, rollups=None):
+    features, last_timestamp, last_block = model_window(active, frame, rollups)
+    preds = await batcher.forecast(active.engine, (active.model_path, last_block, "next"), features,
+                                   last_timestamp, 1)
+    return preds[0]
+
+
+async def forecast_next_steps_async(active, frame, n_steps, rollups=None):
+    features, last_timestamp, last_block = model_window(active, frame, rollups)
+    return await _cached_forecast(active, (active.model_path, last_block, "next_n_steps"), features,
+                                  last_timestamp, n_steps)
+
+
+async def forecast_until_now_async(active, frame, n_steps, rollups=None):
+    features, _, last_block = model_window(active, frame, rollups)
+    return await _cached_forecast(active, (active.model_path, last_block, "now"), features, active.trained_at, n_steps)
+
+
+async def forecast_samples_async(active, frame, n_steps, n_samples=FORECAST_SAMPLES, rollups=None):
+    # Already one batched rollout for all samples, so it skips the batcher
+    return await asyncio.to_thread(forecast_samples, active, frame, n_steps, n_samples, rollups)
+
+
+async def stream_next_steps(active, frame, n_steps, chunk, rollups=None):
+    """forecast_next_steps as an async iterator of (times, preds) chunks: served from the cache
+    when the trajectory is there, otherwise rolled out chunk by chunk and cached once complete."""
+    features, last_timestamp, last_block = model_window(active, frame, rollups)
+    key = (active.model_path, last_block, "next_n_steps")
+    cached = forecast_cache.get(key, n_steps)
+    if cached is not None:
+        forecast_cache.record(True)
+        times, preds = cached
+        for begin in range(0, n_steps, chunk):
+            yield times[begin:begin + chunk], preds[begin:begin + chunk]
+        return
+    forecast_cache.record(False)
+    chunks = active.engine.stream(features, last_timestamp, n_steps, chunk)
+    all_times, all_preds = [], []
+    while (item := await asyncio.to_thread(next, chunks, None)) is not None:
+        all_times.append(item[0])
+        all_preds.append(item[1])
+        yield item
+    forecast_cache.put(key, all_times[0].append(all_times[1:]), np.concatenate(all_preds))
@@ -0,0 +1,148 @@
+import os
+import json
+import fcntl
+import threading
+
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = ['block_number', 'low_gas_price', 'medium_gas_price', 'high_gas_price', 'timestamp']
+CALENDAR_COLUMNS = ['hour', 'minute', 'dayofweek', 'day', 'month', 'year']
+# Local columnar copy of gas_history; empty to always read the database
+HISTORY_FILE = os.getenv("HISTORY_FILE", "history")
+
+# 30 bytes per row, against 64 for the database frame with pandas-derived calendar columns
+COLUMN_DTYPES = {
+    'block_number': np.int64,
+    'low_gas_price': np.float32,
+    'medium_gas_price': np.float32,
+    'high_gas_price': np.float32,
+    'timestamp': np.uint32,  # unix seconds, good until 2106
+    'hour': np.uint8,
+    'minute': np.uint8,
+    'dayofweek': np.uint8,
+    'day': np.uint8,
+    'month': np.uint8,
+    'year': np.uint16,
+}
+META = "meta.json"
+
+
+def calendar_columns(timestamps):
+    """hour/minute/dayofweek/day/month/year of unix-second timestamps, in compact dtypes.
+
+    Same values as the pandas ``.dt`` accessors (UTC), from integer and datetime64 arithmetic.
+    """
+    seconds = np.asarray(timestamps).astype(np.int64)
+    days = seconds // 86400
+    date = days.astype('datetime64[D]')
+    month_start = date.astype('datetime64[M]')
+    year_start = date.astype('datetime64[Y]')
+    return {
+        'hour': (seconds % 86400 // 3600).astype(np.uint8),
+        'minute': (seconds % 3600 // 60).astype(np.uint8),
+        # 1970-01-01 was a Thursday (Monday=0)
+        'dayofweek': ((days + 3) % 7).astype(np.uint8),
+        'day': ((date - month_start.astype('datetime64[D]')).astype(np.int64) + 1).astype(np.uint8),
+        'month': ((month_start - year_start.astype('datetime64[M]')).astype(np.int64) + 1).astype(np.uint8),
+        'year': (year_start.astype(np.int64) + 1970).astype(np.uint16),
+    }
+
+
+def compact_columns(df):
+    """Raw gas_history rows -> every column of COLUMN_DTYPES, calendar included."""
+    columns = {name: np.asarray(df[name]).astype(COLUMN_DTYPES[name]) for name in HISTORY_COLUMNS}
+    columns.update(calendar_columns(columns['timestamp']))
+    return columns
+
+
+class HistoryFile:
+    """Append-only columnar copy of ``gas_history``: one raw file per column, memory-mapped on read.
+
+    ``meta.json`` holds the committed row count and is replaced atomically after the column
+    files are extended, so readers only ever map complete rows. Bytes past the committed
+    count (an append interrupted by a crash) are truncated by the next append.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def meta(self):
+        try:
+            with open(os.path.join(self.path, META)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"rows": 0, "last_block": None}
+
+    def __len__(self):
+        return self.meta()["rows"]
+
+    @property
+    def last_block(self):
+        return self.meta()["last_block"]
+
+    def append(self, df):
+        """Append the rows of df newer than the last stored block; returns how many were added."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            # Serializes writers across processes too (several API workers, training jobs)
+            with open(os.path.join(self.path, ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                meta = self.meta()
+                if meta["last_block"] is not None:
+                    df = df[df['block_number'] > meta["last_block"]]
+                if len(df) == 0:
+                    return 0
+                for name, values in compact_columns(df).items():
+                    with open(self._column_path(name), "ab") as f:
+                        f.truncate(meta["rows"] * np.dtype(COLUMN_DTYPES[name]).itemsize)
+                        f.write(np.ascontiguousarray(values).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                meta = {"rows": meta["rows"] + len(df), "last_block": int(df['block_number'].iloc[-1])}
+                tmp = os.path.join(self.path, f".{META}.tmp")
+                with open(tmp, "w") as f:
+                    json.dump(meta, f)
+                os.replace(tmp, os.path.join(self.path, META))
+                return len(df)
+
+    def columns(self, n=None, names=None):
+        """Read-only memory maps of the last n rows (all rows by default), per column."""
+        rows = len(self)
+        start = rows - min(n, rows) if n is not None else 0
+        columns = {}
+        for name in names or COLUMN_DTYPES:
+            dtype = COLUMN_DTYPES[name]
+            if rows == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+                continue
+            mapped = np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(rows,))
+            columns[name] = mapped[start:]
+        return columns
+
+    def frame(self, n=None):
+        # Columns keep their compact dtypes; pandas copies them out of the maps once
+        return pd.DataFrame(self.columns(n))
+
+    def frame_between(self, start, end, lead=0):
+        """Rows with start <= timestamp < end (unix seconds) and the `lead` rows before them;
+        None when the file does not reach end yet."""
+        timestamps = self.columns(names=['timestamp'])['timestamp']
+        if len(timestamps) == 0 or timestamps[-1] < end - 1:
+            return None
+        lo, hi = np.searchsorted(timestamps, [start, end])
+        lo = max(lo - lead, 0)
+        return pd.DataFrame({name: column[lo:hi] for name, column in self.columns().items()})
+
+    def sync(self, load_all, load_after):
+        """Append what the database has beyond the file: everything (load_all()) for an empty
+        file, otherwise load_after(last_block)."""
+        last_block = self.last_block
+        return self.append(load_all() if last_block is None else load_after(last_block))
+
+
+history_file = HistoryFile(HISTORY_FILE) if HISTORY_FILE else None
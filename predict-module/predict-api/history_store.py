@@ -0,0 +1,189 @@
+import os
+import time
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+
+from model_utils import HISTORY_TABLE, load_recent_data, load_recent_data_async
+from db import listen, unlisten
+from history_file import HISTORY_COLUMNS, CALENDAR_COLUMNS, calendar_columns, history_file
+from rollups import Rollups, PRICE_COLUMNS
+from telemetry import timed
+
+# Calendar columns are derived once per row as it comes in, not on every request
+STORE_COLUMNS = HISTORY_COLUMNS + CALENDAR_COLUMNS
+# Stores of the default table use the module's history file, looked up on use
+SHARED_FILE = object()
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", 10000))
+HISTORY_REFRESH_INTERVAL = float(os.getenv("HISTORY_REFRESH_INTERVAL", 1))
+# Postgres channel the ingester NOTIFYs on each insert; empty to rely on polling only
+HISTORY_NOTIFY_CHANNEL = os.getenv("HISTORY_NOTIFY_CHANNEL", "gas_history")
+
+
+class HistoryStore:
+    """Bounded, array-backed tail of ``gas_history`` that is only ever extended with new blocks.
+
+    Rows are appended after the live tail and never rewritten in place. When the buffer is full the
+    live tail is copied into a fresh buffer, so views handed out earlier stay valid.
+
+    The first refresh starts from the local history file when there is one, so only the
+    blocks it is missing come from the database; later refreshes append to the file. Every
+    new row also goes into the per-minute/per-hour rollups that model contexts are built from.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, refresh_interval=HISTORY_REFRESH_INTERVAL, table=HISTORY_TABLE,
+                 file=SHARED_FILE, notify_channel=HISTORY_NOTIFY_CHANNEL):
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self.table = table
+        self._file = file
+        self.notify_channel = notify_channel
+        # (buffer, start, end) is swapped as one tuple so readers never see a torn state
+        self._state = (np.empty((2 * capacity, len(STORE_COLUMNS)), dtype=np.float64), 0, 0)
+        self._lock = threading.Lock()
+        self._new_rows = asyncio.Condition()
+        self._last_refresh = 0.0
+        self.last_block = None
+        self.rollups = Rollups()
+
+    def __len__(self):
+        _, start, end = self._state
+        return end - start
+
+    @property
+    def file(self):
+        return history_file if self._file is SHARED_FILE else self._file
+
+    @property
+    def nbytes(self):
+        # The buffer is allocated up front, so this is what the store holds however full it is
+        return self._state[0].nbytes
+
+    def _append(self, rows):
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        if n == 0:
+            return
+        buffer, start, end = self._state
+        if end + n > len(buffer):
+            keep = min(self.capacity - n, end - start)
+            new_buffer = np.empty_like(buffer)
+            new_buffer[:keep] = buffer[end - keep:end]
+            buffer, start, end = new_buffer, 0, keep
+        buffer[end:end + n] = rows
+        end += n
+        self._state = (buffer, max(start, end - self.capacity), end)
+        self.last_block = int(rows[-1, 0])
+
+    def _query_args(self):
+        if self.last_block is None:
+            return {"limit": self.capacity, "table": self.table}
+        return {"after_block": self.last_block, "table": self.table}
+
+    def _apply(self, df):
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            if df.empty:
+                return 0
+            rows = np.asarray(df[HISTORY_COLUMNS], dtype=np.float64)
+            if self.last_block is not None:
+                # A concurrent refresh may already have appended part of this batch
+                rows = rows[rows[:, 0] > self.last_block]
+            timestamps = rows[:, HISTORY_COLUMNS.index('timestamp')]
+            self.rollups.append(timestamps, rows[:, [HISTORY_COLUMNS.index(col) for col in PRICE_COLUMNS]])
+            calendar = calendar_columns(timestamps)
+            self._append(np.column_stack([rows] + [calendar[col] for col in CALENDAR_COLUMNS]))
+            return len(rows)
+
+    def _load_file(self):
+        file = self.file
+        if self.last_block is None and file is not None and len(file):
+            self._apply(file.frame(self.capacity))
+
+    def _persist(self, df):
+        # An empty file is filled by the full sync in load_data(); appending the tail to it
+        # would leave the older history out of the file for good
+        try:
+            if self.file.last_block is not None:
+                self.file.append(df)
+        except Exception as e:
+            print(f"History file append failed: {e}")
+
+    @timed("history_refresh")
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return 0
+        self._load_file()
+        df = load_recent_data(**self._query_args())
+        if self.file is not None and len(df):
+            self._persist(df)
+        return self._apply(df)
+
+    @timed("history_refresh")
+    async def refresh_async(self):
+        if self.last_block is None:
+            await asyncio.to_thread(self._load_file)
+        df = await load_recent_data_async(**self._query_args())
+        if self.file is not None and len(df):
+            # fsyncs, so off the event loop
+            await asyncio.to_thread(self._persist, df)
+        added = self._apply(df)
+        if added:
+            async with self._new_rows:
+                self._new_rows.notify_all()
+        return added
+
+    async def wait_for_block(self, after_block, timeout=None):
+        """Wait until the tail moves past after_block (or timeout); returns the last block."""
+        try:
+            async with self._new_rows:
+                await asyncio.wait_for(self._new_rows.wait_for(lambda: self.last_block != after_block), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.last_block
+
+    async def run_refresher(self):
+        # Keeps the tail current off the request path; handlers only read from memory.
+        # A NOTIFY from the ingester wakes it immediately, polling covers missed notifications.
+        notified = asyncio.Event()
+        listener = None
+        if self.notify_channel:
+            try:
+                listener = await listen(self.notify_channel, notified.set)
+            except Exception as e:
+                print(f"LISTEN {self.notify_channel} unavailable, polling only: {e}")
+        try:
+            while True:
+                try:
+                    await self.refresh_async()
+                except Exception as e:
+                    print(f"History refresh failed: {e}")
+                try:
+                    await asyncio.wait_for(notified.wait(), self.refresh_interval)
+                except asyncio.TimeoutError:
+                    pass
+                notified.clear()
+        finally:
+            # Stores of evicted model slots stop listening with their refresher
+            if listener is not None:
+                try:
+                    await unlisten(self.notify_channel, listener)
+                except Exception:
+                    pass
+
+    def tail(self, n=None):
+        # Read-only view on the last n rows, no copy
+        buffer, start, end = self._state
+        if n is not None:
+            start = max(start, end - n)
+        view = buffer[start:end]
+        view.flags.writeable = False
+        return view
+
+    def frame(self, n=None):
+        return pd.DataFrame(self.tail(n), columns=STORE_COLUMNS, copy=False)
+
+
+history = HistoryStore()
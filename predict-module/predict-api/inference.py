@@ -0,0 +1,196 @@
+import io
+import os
+import copy
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+# eager | torchscript | onnx | quantized (dynamic int8 LSTM/Linear)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "onnx")
+# Max deviation from the eager model on the probe rollout, relative to each price's fitted range
+INFERENCE_TOLERANCE = float(os.getenv("INFERENCE_TOLERANCE", 1e-4))
+INFERENCE_QUANTIZED_TOLERANCE = float(os.getenv("INFERENCE_QUANTIZED_TOLERANCE", 0.05))
+INFERENCE_PROBE_STEPS = int(os.getenv("INFERENCE_PROBE_STEPS", 32))
+
+BACKENDS = ("eager", "torchscript", "onnx", "quantized")
+TORCHSCRIPT_FILE = "rollout.ts"
+ONNX_ENCODE_FILE = "encode.onnx"
+ONNX_STEP_FILE = "step.onnx"
+
+
+class _Encode(nn.Module):
+    def __init__(self, fused):
+        super().__init__()
+        self.fused = fused
+
+    def forward(self, window):
+        return self.fused.encode(window)
+
+
+class _Step(nn.Module):
+    def __init__(self, fused):
+        super().__init__()
+        self.fused = fused
+
+    def forward(self, gas, calendar, h, c):
+        return self.fused.step(gas, calendar, h, c)
+
+
+def script(fused):
+    scripted = torch.jit.script(copy.deepcopy(fused).cpu().eval())
+    # Freezing inlines the weights and scalers as constants
+    return torch.jit.freeze(scripted, preserved_attrs=["encode", "step"])
+
+
+def export_onnx(fused, encode_file, step_file):
+    fused = copy.deepcopy(fused).cpu().eval()
+    hidden = fused.lstm.hidden_size
+    window = torch.zeros(1, 10, fused.lstm.input_size)
+    gas, calendar = torch.zeros(1, 3), torch.zeros(1, fused.lstm.input_size - 3)
+    h = c = torch.zeros(1, 1, hidden)
+    state_axes = {1: "batch"}
+    torch.onnx.export(_Encode(fused), (window,), encode_file, dynamo=False,
+                      input_names=["window"], output_names=["gas", "h", "c"],
+                      dynamic_axes={"window": {0: "batch", 1: "rows"}, "gas": {0: "batch"},
+                                    "h": state_axes, "c": state_axes})
+    torch.onnx.export(_Step(fused), (gas, calendar, h, c), step_file, dynamo=False,
+                      input_names=["gas", "calendar", "h", "c"], output_names=["next_gas", "next_h", "next_c"],
+                      dynamic_axes={"gas": {0: "batch"}, "calendar": {0: "batch"}, "h": state_axes, "c": state_axes,
+                                    "next_gas": {0: "batch"}, "next_h": state_axes, "next_c": state_axes})
+
+
+def _discard(*files):
+    for file in files:
+        if os.path.exists(file):
+            os.remove(file)
+
+
+def export_artifacts(fused, folder):
+    """Write the TorchScript rollout, and the ONNX encode/step graphs when onnx is installed.
+
+    Best-effort: a graph that fails to export is left out of the version, and the backends
+    that need it serve the eager model instead.
+    """
+    torchscript_file = os.path.join(folder, TORCHSCRIPT_FILE)
+    try:
+        script(fused).save(torchscript_file)
+    except Exception as e:
+        print(f"TorchScript export failed, publishing without it: {e}")
+        _discard(torchscript_file)
+    try:
+        import onnx  # noqa: F401
+    except ImportError:
+        return
+    encode_file, step_file = os.path.join(folder, ONNX_ENCODE_FILE), os.path.join(folder, ONNX_STEP_FILE)
+    try:
+        export_onnx(fused, encode_file, step_file)
+    except Exception as e:
+        print(f"ONNX export failed, publishing without it: {e}")
+        _discard(encode_file, step_file)
+
+
+class OnnxRollout:
+    """Same loop as FusedRollout.forward over two ONNX Runtime sessions; numpy in and out.
+
+    ``encode``/``step`` mirror FusedRollout's methods on tensors, for step-by-step streaming.
+    """
+
+    def __init__(self, encode_model, step_model):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CPUExecutionProvider"]
+        self._encode = ort.InferenceSession(encode_model, options, providers=providers)
+        self._step = ort.InferenceSession(step_model, options, providers=providers)
+
+    def encode(self, window):
+        return tuple(torch.from_numpy(out) for out in self._encode.run(None, {"window": window.cpu().numpy()}))
+
+    def step(self, gas, calendar, h, c):
+        inputs = {"gas": gas.numpy(), "calendar": calendar.contiguous().numpy(), "h": h.numpy(), "c": c.numpy()}
+        return tuple(torch.from_numpy(out) for out in self._step.run(None, inputs))
+
+    def __call__(self, window, calendar):
+        window = window.cpu().numpy()
+        calendar = calendar.cpu().numpy()
+        gas, h, c = self._encode.run(None, {"window": window})
+        calendar = np.broadcast_to(calendar, (len(gas),) + calendar.shape[1:])
+        preds = np.empty((len(gas), calendar.shape[1] + 1, gas.shape[1]), dtype=np.float32)
+        preds[:, 0] = gas
+        for step in range(calendar.shape[1]):
+            gas, h, c = self._step.run(None, {"gas": gas, "calendar": np.ascontiguousarray(calendar[:, step]),
+                                             "h": h, "c": c})
+            preds[:, step + 1] = gas
+        return preds
+
+
+def _artifact(artifact_dir, name):
+    path = os.path.join(artifact_dir, name) if artifact_dir else None
+    return path if path and os.path.exists(path) else None
+
+
+def build_runner(fused, backend, artifact_dir=None):
+    """Callable (window, calendar) -> (batch, n_steps, 3) prices for the given backend.
+
+    Artifacts exported at training time are used when present, otherwise the backend is
+    built from the eager module.
+    """
+    if backend == "eager":
+        return fused
+    if backend == "torchscript":
+        path = _artifact(artifact_dir, TORCHSCRIPT_FILE)
+        return torch.jit.load(path, map_location="cpu") if path else script(fused)
+    if backend == "onnx":
+        encode_file, step_file = _artifact(artifact_dir, ONNX_ENCODE_FILE), _artifact(artifact_dir, ONNX_STEP_FILE)
+        if encode_file and step_file:
+            return OnnxRollout(encode_file, step_file)
+        encode, step = io.BytesIO(), io.BytesIO()
+        export_onnx(fused, encode, step)
+        return OnnxRollout(encode.getvalue(), step.getvalue())
+    if backend == "quantized":
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(fused).cpu(), {nn.LSTM, nn.Linear},
+                                                      dtype=torch.qint8)
+    raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+
+
+def probe_inputs(fused, batch=2, rows=10, n_steps=INFERENCE_PROBE_STEPS, seed=0):
+    # Random raw inputs spanning the range the scalers were fitted on
+    generator = torch.Generator().manual_seed(seed)
+    x_scale, x_min = fused.x_scale.cpu(), fused.x_min.cpu()
+    window = (torch.rand(batch, rows, len(x_scale), generator=generator) - x_min) / x_scale
+    calendar = (torch.rand(batch, n_steps - 1, len(x_scale) - 3, generator=generator) - x_min[3:]) / x_scale[3:]
+    return window, calendar
+
+
+def agreement(fused, runner):
+    """Max deviation of runner from the eager rollout on the probe, relative to the price ranges."""
+    window, calendar = probe_inputs(fused)
+    device = fused.x_scale.device
+    with torch.inference_mode():
+        expected = fused(window.to(device), calendar.to(device)).cpu().numpy()
+        # Non-eager backends run on CPU
+        actual = runner(window, calendar)
+    actual = actual.cpu().numpy() if torch.is_tensor(actual) else actual
+    y_range = 1 / fused.y_scale.cpu().numpy()
+    return float(np.max(np.abs(actual - expected) / y_range))
+
+
+def select_runner(fused, backend=INFERENCE_BACKEND, artifact_dir=None):
+    """Build the configured backend and check it against the eager module.
+
+    Falls back to eager when the backend is unavailable or disagrees. Returns (runner, info).
+    """
+    if backend == "eager":
+        return fused, {"name": "eager"}
+    tolerance = INFERENCE_QUANTIZED_TOLERANCE if backend == "quantized" else INFERENCE_TOLERANCE
+    try:
+        runner = build_runner(fused, backend, artifact_dir)
+        error = agreement(fused, runner)
+    except Exception as e:
+        print(f"Inference backend {backend} unavailable, using eager: {e}")
+        return fused, {"name": "eager", "requested": backend, "error": str(e)}
+    if not error <= tolerance:
+        print(f"Inference backend {backend} deviates by {error:.2e} (> {tolerance:.0e}), using eager")
+        return fused, {"name": "eager", "requested": backend, "max_error": error}
+    return runner, {"name": backend, "max_error": error}
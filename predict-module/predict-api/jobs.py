@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from telemetry import JOB_RUNS
+
+RETRAIN_QUEUE_SIZE = int(os.getenv("RETRAIN_QUEUE_SIZE", 4))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", 50))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, fn):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def report(self, progress, message=None):
+        """Called by the job body; raises JobCancelled once cancellation was requested."""
+        self.progress = round(min(max(progress, 0.0), 1.0), 4)
+        if message is not None:
+            self.message = message
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def info(self):
+        end = self.finished_at or (datetime.utcnow() if self.started_at else None)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "duration_s": round((end - self.started_at).total_seconds(), 3) if self.started_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs jobs one at a time from a bounded queue.
+
+    Submitting a kind that is already queued or running returns the existing job
+    (single-flight), so concurrent triggers never start overlapping retrains.
+    """
+
+    def __init__(self, max_queued=RETRAIN_QUEUE_SIZE, history_size=JOB_HISTORY_SIZE, covers=None):
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._history_size = history_size
+        # kind -> kinds whose active job already satisfies a request for it
+        self._covers = covers or {}
+        self._worker = None
+
+    def submit(self, kind, fn):
+        with self._lock:
+            covering = {kind, *self._covers.get(kind, ())}
+            for job in self._jobs.values():
+                if job.active and not job.cancelled and job.kind in covering:
+                    return job
+            job = Job(kind, fn)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull()
+            self._jobs[job.id] = job
+            self._trim()
+            self._ensure_worker()
+            return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [job.info() for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.active:
+            job._cancel.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = datetime.utcnow()
+        return job
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(self._jobs) - self._history_size, 0)]:
+            del self._jobs[job_id]
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.cancelled:
+                continue
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            start = time.perf_counter()
+            try:
+                job.result = job.fn(job)
+                job.status = "succeeded"
+                job.progress = 1.0
+            except JobCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Job {job.kind} {job.id} failed: {e}")
+            job.finished_at = datetime.utcnow()
+            JOB_RUNS.labels(job.kind, job.status).inc()
+            print(f"Job {job.kind} {job.id} {job.status} in {time.perf_counter() - start:.1f}s")
@@ -1,22 +1,37 @@
-from fastapi import FastAPI, HTTPException, Query
+import time
+
+# Import time of the serving modules, reported with the warm-up phases on /startup
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import numpy as np
-import pandas as pd
-import torch
 import os
 import glob
-from model_utils import (
-    load_data, add_time_features,
-    train_models, MultivariateLSTM, device
-)
-from datetime import datetime, timedelta
+from model_utils import train_models, retrain_incremental, load_history_range
+from model_registry import registry
+from artifact_store import ArtifactStore
+from history_store import history
+from forecast_cache import forecast_cache
+from scheduler import scheduler
+from batcher import batcher
+from streaming import forecast_events
+from slots import slots, DEFAULT_CHAIN, DEFAULT_MODEL
+from ensemble import ensemble_registry, error_metrics
+from jobs import JobManager, JobQueueFull
+from forecasting import NEXT_STEP_WINDOW, MAX_HORIZON, PRICE_COLS, FORECAST_SAMPLES, MAX_SAMPLES
+import forecasting
+from db import close_pool, close_async_pool
+from telemetry import DEBUG_PROFILING, REQUEST_SECONDS, profiled, register_gauges, record_startup, startup_phases
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from datetime import datetime, timedelta, timezone
 from fastapi.middleware.cors import CORSMiddleware
 
-import pickle
-import threading
+import asyncio
+import numpy as np
 
-threads = []
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 app = FastAPI()
 
@@ -29,6 +44,81 @@ app.add_middleware(
 )
 
 MODEL_DIR = "saved_models"
+# Rows scored by one /backtest/ensemble request
+MAX_BACKTEST_ROWS = int(os.getenv("MAX_BACKTEST_ROWS", 200000))
+# "background" accepts connections right away and warms the default slot behind them (requests
+# wait for it); "blocking" finishes the warm-up before the server starts accepting
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+
+register_gauges(history, registry, forecast_cache, batcher, slots)
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    start = time.perf_counter()
+    # With DEBUG_PROFILING set, ?profile=1 profiles this request; the file is named in X-Profile-File
+    if DEBUG_PROFILING and request.query_params.get("profile"):
+        with profiled(request.url.path) as path:
+            response = await call_next(request)
+        if path:
+            response.headers["X-Profile-File"] = path
+    else:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched",
+                           response.status_code).observe(time.perf_counter() - start)
+    return response
+
+async def warm_up():
+    # The default slot; the others load on their first request
+    for phase, seconds in (await slots.start()).items():
+        record_startup(phase, seconds)
+    record_startup("ready", time.perf_counter() - IMPORT_STARTED)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    record_startup("import", IMPORT_SECONDS)
+    if STARTUP_WARMUP == "blocking":
+        await warm_up()
+    else:
+        app.state.warmup = asyncio.create_task(warm_up())
+    app.state.forecast_scheduler = asyncio.create_task(scheduler.run())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if getattr(app.state, "warmup", None) is not None:
+        app.state.warmup.cancel()
+    await slots.close()
+    app.state.forecast_scheduler.cancel()
+    await batcher.close()
+    await close_async_pool()
+    close_pool()
+
+async def get_slot(chain, model):
+    slot = await slots.get(chain, model)
+    if slot is None:
+        raise HTTPException(status_code=404, detail="Slot inconnu.")
+    return slot
+
+def get_active_model(slot=slots.default):
+    active = slot.registry.get()
+    if active is None:
+        raise HTTPException(status_code=404, detail="Modèle multivarié non trouvé.")
+    return active
+
+def get_history(window, slot=slots.default):
+    if len(slot.history) == 0:
+        raise HTTPException(status_code=503, detail="Historique de gas indisponible.")
+    return slot.history.frame(window)
+
+def get_ensemble():
+    ensemble = ensemble_registry.get()
+    if ensemble is None:
+        raise HTTPException(status_code=404, detail="Modèles par cible non trouvés.")
+    return ensemble
+
+def unix_seconds(value):
+    # Naive datetimes are UTC, like the timestamps in gas_history
+    return int(value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp())
 
 class PredictRequest(BaseModel):
     timestamp: Optional[str] = None
@@ -43,73 +133,145 @@ def list_models():
     return models
 
 @app.get("/metrics")
+def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/models/metrics")
 def get_model_metrics():
     metrics = {}
     for target_folder in glob.glob(os.path.join(MODEL_DIR, '*')):
-        model_files = glob.glob(os.path.join(target_folder, '*'))
-        for f in model_files:
-            if f.endswith(".pkl") or f.endswith(".pt"):
-                # Assume RMSE is part of filename, or extract from metadata in future
-                metrics.setdefault(os.path.basename(target_folder), []).append({"model": os.path.basename(f)})
+        store = ArtifactStore(target_folder)
+        for version in store.versions():
+            manifest = store.manifest(version)
+            metrics.setdefault(os.path.basename(target_folder), []).append({
+                "version": version,
+                "metrics": manifest.get("metrics") or manifest.get("models"),
+            })
     return metrics
 
-@app.get("/retrain")
-def retrain_models():
-    results = train_models()
+@app.get("/models/active")
+async def get_active_model_info(chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    return get_active_model(await get_slot(chain, model)).info()
+
+@app.get("/startup")
+def get_startup(response: Response):
+    # Readiness probe: 503 until the default slot is warm; seconds per startup phase
+    ready = slots.default.ready.is_set()
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "warmup": STARTUP_WARMUP, "seconds": startup_phases}
+
+@app.get("/slots")
+def list_slots():
+    return slots.info()
+
+@app.get("/forecast/cache")
+def get_forecast_cache_stats():
+    return forecast_cache.stats()
+
+@app.get("/forecast/batcher")
+def get_batcher_stats():
+    return batcher.stats()
+
+@app.get("/history/rollups")
+async def get_history_rollups(resolution: str = Query("minute", pattern="^(minute|hour)$"),
+                              n: int = Query(60, ge=1, le=10000), chain: str = DEFAULT_CHAIN,
+                              model: str = DEFAULT_MODEL):
+    # min/median/max of each price per closed minute or hour bucket, oldest first
+    slot = await get_slot(chain, model)
+    return {"resolution": resolution, "rollups": getattr(slot.history.rollups, resolution).rows(n)}
+
+@app.get("/forecast/snapshot")
+def get_forecast_snapshot():
+    snapshot = scheduler.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Aucune prévision précalculée.")
+    return snapshot.info()
+
+@app.post("/models/reload")
+def reload_active_model():
+    registry.reload(force=True)
+    return get_active_model().info()
+
+RETRAIN_MODES = ("full", "incremental", "auto")
+
+# A queued or running full retrain also answers incremental/auto requests
+retrain_jobs = JobManager(covers={"incremental": ("full", "auto"), "auto": ("full",)})
+
+def run_retrain(mode, job):
+    # mode: "full" refits everything, "incremental" fine-tunes the active multivariate model on
+    # new blocks, "auto" tries incremental and falls back to full
+    if mode in ("incremental", "auto"):
+        active = registry.get()
+        res = retrain_incremental(active, progress=job.report)
+        if res is not None and res["mode"] == "up_to_date":
+            # No new blocks since the active model: nothing to train or reload
+            return {"multivariate": {"version": active.version, "mode": res["mode"], "new_rows": 0}}
+        if res is not None:
+            registry.reload()
+            return {"multivariate": {"version": res["version"], "model_type": res["model_type"], "rmse": res["rmse"],
+                                     "mode": res["mode"], "new_rows": res["new_rows"]}}
+        if mode == "incremental":
+            raise RuntimeError("Réentraînement incrémental impossible, un entraînement complet est nécessaire.")
+        job.report(0.0, "falling back to a full retrain")
+
+    results = train_models(progress=job.report)
+    registry.reload()
     summary = {}
     for key, value in results.items():
         if key == 'multivariate':
-            summary[key] = {"model_type": value["model_type"], "rmse": value["rmse"]}
+            summary[key] = {"version": value["version"], "model_type": value["model_type"], "rmse": value["rmse"],
+                            "timing": value["timing"]}
         else:
-            summary[key] = {model_type: {"rmse": model_data["rmse"]} for model_type, model_data in value.items()}
+            summary[key] = {model_type: {"rmse": model_data["rmse"], "timing": model_data["timing"]}
+                            for model_type, model_data in value.items()}
     return summary
 
-def create_features_multivariate_full(df, feature_cols, target_cols=None, window=10):
-    X, y = [], []
-    for i in range(len(df) - window):
-        X.append(df[feature_cols].iloc[i:i+window].values)
-        if target_cols:
-            y.append(df[target_cols].iloc[i+window].values)
-
-    X = np.array(X)
-    y = np.array(y) if target_cols else None
-    return X, y
+def submit_retrain(mode):
+    return retrain_jobs.submit(mode, lambda job: run_retrain(mode, job))
+
+@app.api_route("/retrain", methods=["GET", "POST"], status_code=202)
+def retrain_models(mode: str = "full"):
+    if mode not in RETRAIN_MODES:
+        raise HTTPException(status_code=422, detail=f"mode doit être l'un de {RETRAIN_MODES}.")
+    try:
+        job = submit_retrain(mode)
+    except JobQueueFull:
+        raise HTTPException(status_code=429, detail="File de réentraînement pleine.")
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/retrain/jobs")
+def list_retrain_jobs():
+    return retrain_jobs.list()
+
+def get_retrain_job(job_id):
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inconnu.")
+    return job
+
+@app.get("/retrain/{job_id}")
+def get_retrain_status(job_id: str):
+    return get_retrain_job(job_id).info()
+
+@app.delete("/retrain/{job_id}")
+def cancel_retrain(job_id: str):
+    get_retrain_job(job_id)
+    return retrain_jobs.cancel(job_id).info()
 
 @app.get("/predict/gasfee")
-def predict_next_gas_fee():
-    df = load_data()
-    df = add_time_features(df)
-
-    # Charger les scalers
-    with open(f"{MODEL_DIR}/multivariate/scaler_x.pkl", "rb") as f:
-        scaler_x = pickle.load(f)
-    with open(f"{MODEL_DIR}/multivariate/scaler_y.pkl", "rb") as f:
-        scaler_y = pickle.load(f)
-
-    # Charger le modèle entraîné
-    latest_model_path = sorted(glob.glob(f"{MODEL_DIR}/multivariate/multivariate_lstm_*.pt"))[-1]
-    model = MultivariateLSTM(input_size=9, hidden_size=300).to(device)
-    model.load_state_dict(torch.load(latest_model_path, map_location=device))
-    model.eval()
-
-    # Préparer les données d'entrée
-    feature_cols = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
-                    'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
-    window = 10
-    X_seq, _ = create_features_multivariate_full(df, feature_cols, target_cols=None, window=window)
-
-    # Appliquer la normalisation
-    X_last = X_seq[-1:]  # (1, window, features)
-    X_last_2d = X_last.reshape(-1, X_last.shape[2])
-    X_scaled_2d = scaler_x.transform(X_last_2d)
-    X_scaled = X_scaled_2d.reshape(X_last.shape)
-
-    X_input = torch.tensor(X_scaled.astype(np.float32)).to(device)
-
-    # Prédiction
-    with torch.no_grad():
-        pred_scaled = model(X_input).cpu().numpy()
-    pred = scaler_y.inverse_transform(pred_scaled)[0]  # (low, medium, high)
+async def predict_next_gas_fee(chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    slot = await get_slot(chain, model)
+    active = get_active_model(slot)
+    frame = get_history(NEXT_STEP_WINDOW, slot)
+
+    # The scheduler only precomputes the default slot
+    snapshot = scheduler.snapshot if slot is slots.default else None
+    if snapshot is not None and snapshot.matches(active, frame):
+        pred = snapshot.next_gas_fee
+    else:
+        # (low, medium, high)
+        pred = await forecasting.predict_next_gas_fee_async(active, frame, slot.history.rollups)
 
     return {
         "predicted_gas_fee": {
@@ -120,82 +282,26 @@ def predict_next_gas_fee():
     }
 
 @app.get("/predict/now")
-def predict_until_now():
-    global threads
-    model_path = sorted(glob.glob(f"{MODEL_DIR}/multivariate/multivariate_lstm_*.pt"))
-    if not model_path:
-        raise HTTPException(status_code=404, detail="Modèle multivarié non trouvé.")
-    
-    model_file = model_path[-1]
-    scaler_x_path = "saved_models/multivariate/scaler_x.pkl"
-    scaler_y_path = "saved_models/multivariate/scaler_y.pkl"
-
-    model, scaler_x, scaler_y = load_model_and_scalers(model_file, scaler_x_path, scaler_y_path)
-
-    df = load_data()
-    df = df.sort_values("timestamp").reset_index(drop=True)
-
-    feature_cols = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
-                    'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
-    window = 1000
-
-    df = add_time_features(df)
-
-    features = df[feature_cols].values
-    input_seq = features[-window:]
-
-    input_seq_scaled = scaler_x.transform(input_seq)
-    current_seq = torch.tensor(input_seq_scaled, dtype=torch.float32).unsqueeze(0).to(device)
-
-    # last_timestamp = df['timestamp'].iloc[-1]
-
-    current_time = datetime.utcnow()
-    timestamp_model = model_file.split("_")[-2]+"_"+model_file.split("_")[-1].split(".pt")[0]
-    last_timestamp = datetime.strptime(timestamp_model, "%Y%m%d_%H%M%S")# pd.to_datetime(df['timestamp'].iloc[-1])
-    print("Last time train: ", last_timestamp)
-    n_steps = int((current_time-last_timestamp).total_seconds()//60)
-    if n_steps >= 10:
-        threads = [t for t in threads if t and t.is_alive()]
-        if len(threads)==0:
-            print("Retrain a new model more update to date")
-            t=threading.Thread(target=retrain_models).start()
-            threads.append(t)
-
-    preds = []
-    next_time = None
-    for step in range(1, n_steps + 1):
-        with torch.no_grad():
-            output_scaled = model(current_seq)
-        
-        output_scaled_np = output_scaled.cpu().numpy()
-        output_np = scaler_y.inverse_transform(output_scaled_np).reshape(-1)
-
-        pred_gas = output_np[:3]
-        preds.append(pred_gas.tolist()+[last_timestamp+timedelta(minutes=step-1)])
-
-        next_time = last_timestamp + timedelta(minutes=step)
-        next_features = np.array([
-            pred_gas[0],
-            pred_gas[1],
-            pred_gas[2],
-            next_time.hour,
-            next_time.minute,
-            next_time.weekday(),
-            next_time.day,
-            next_time.month,
-            next_time.year,
-        ]).reshape(1, 9)
-
-        next_features_scaled = scaler_x.transform(next_features).reshape(1, 1, 9)
-        next_features_tensor = torch.tensor(next_features_scaled, dtype=torch.float32).to(device)
-
-        current_seq = torch.cat([current_seq[:, 1:, :], next_features_tensor], dim=1)
-
-    print(f"Needed {n_steps} step to predict current gas fee")
-    
+async def predict_until_now(chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    slot = await get_slot(chain, model)
+    active = get_active_model(slot)
+    frame = get_history(NEXT_STEP_WINDOW, slot)
+
+    last_timestamp = active.trained_at
+    n_steps = forecasting.steps_until_now(active)
+    # Retraining only covers the default slot; other slots are published to their model_dir
+    if n_steps >= 10 and slot is slots.default:
+        try:
+            submit_retrain("auto")
+        except JobQueueFull:
+            pass
+
+    _, preds = await forecasting.forecast_until_now_async(active, frame, n_steps, slot.history.rollups)
+    next_time = last_timestamp + timedelta(minutes=n_steps) if n_steps else None
+
     # Renvoyer la dernière prédiction
     if len(preds)==0:
-        preds.append(input_seq[-1].tolist()[:3])
+        preds = frame[PRICE_COLS].values[-1:]
     return {
         "predicted_gas_fee_at_now": {
             "timestamp": str(next_time) if next_time else str(last_timestamp),
@@ -205,87 +311,103 @@ def predict_until_now():
         }
     }
 
-def load_model_and_scalers(model_path, scaler_x_path, scaler_y_path):
-    model = MultivariateLSTM(input_size=9, hidden_size=300).to(device)
-    model.load_state_dict(torch.load(model_path))
-    model.eval()
-
-    with open(scaler_x_path, "rb") as f:
-        scaler_x = pickle.load(f)
-    with open(scaler_y_path, "rb") as f:
-        scaler_y = pickle.load(f)
+@app.get("/predict/next_n_steps")
+async def predict_next_n_steps(n_steps: int = Query(1, ge=1, le=MAX_HORIZON), key:str=Query("medium_gas_price"),
+                               chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    slot = await get_slot(chain, model)
+    active = get_active_model(slot)
+    frame = get_history(NEXT_STEP_WINDOW, slot)
+
+    times, preds = await forecasting.forecast_next_steps_async(active, frame, n_steps, slot.history.rollups)
+
+    return {"predictions": forecasting.top_k_steps(times, preds, key)}
+
+
+@app.get("/predict/quantiles")
+async def predict_quantiles(n_steps: int = Query(60, ge=1, le=MAX_HORIZON), key: str = Query("medium_gas_price"),
+                            quantiles: str = Query("0.1,0.5,0.9"), threshold: Optional[float] = None,
+                            samples: int = Query(FORECAST_SAMPLES, ge=2, le=MAX_SAMPLES),
+                            chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    # Quantiles of each step across sampled trajectories, rolled out together as one batch;
+    # with a threshold, the probability that the price is below it at each step and at any step
+    try:
+        levels = sorted(float(q) for q in quantiles.split(","))
+    except ValueError:
+        levels = []
+    if not levels or not all(0 <= q <= 1 for q in levels):
+        raise HTTPException(status_code=422, detail="quantiles doit être une liste de nombres entre 0 et 1.")
+    slot = await get_slot(chain, model)
+    active = get_active_model(slot)
+    frame = get_history(NEXT_STEP_WINDOW, slot)
+
+    times, trajectories = await forecasting.forecast_samples_async(active, frame, n_steps, samples,
+                                                                   slot.history.rollups)
+    steps, p_below_any = forecasting.quantile_steps(times, trajectories, key, levels, threshold)
+    return {
+        "last_block": int(frame['block_number'].iloc[-1]),
+        "samples": samples,
+        # From the model's held-out residuals, or FORECAST_NOISE_SCALE for older models
+        "noise_scale": dict(zip(PRICE_COLS, forecasting.noise_scale(active))),
+        "calibrated": 'residual_scale' in active.metadata,
+        "threshold": threshold,
+        "p_below_any": p_below_any,
+        "predictions": steps,
+    }
 
-    return model, scaler_x, scaler_y
+@app.get("/predict/ensemble")
+def predict_ensemble():
+    # Per-target MLP / random forest / LSTM predictions for the next block and their RMSE-weighted blend
+    ensemble = get_ensemble()
+    frame = get_history(ensemble.window)
+    if len(frame) < ensemble.window:
+        raise HTTPException(status_code=503, detail="Historique de gas insuffisant.")
+    features, _, last_block = forecasting.feature_window(frame, ensemble.window)
+    preds = ensemble.predict(features)
+    return {
+        "last_block": last_block,
+        "predictions": {target: {model_type: round(float(values[-1]), 4) for model_type, values in target_preds.items()}
+                        for target, target_preds in preds.items()},
+        "models": ensemble.info(),
+    }
 
-@app.get("/predict/next_n_steps")
-def predict_next_n_steps(n_steps: int = Query(1, ge=1, le=600), key:str=Query("medium_gas_price")):
-    model_path = sorted(glob.glob(f"{MODEL_DIR}/multivariate/multivariate_lstm_*.pt"))
-    if not model_path:
-        raise HTTPException(status_code=404, detail="Modèle multivarié non trouvé.")
-    
-    model_file = model_path[-1]
-    scaler_x_path = "saved_models/multivariate/scaler_x.pkl"
-    scaler_y_path = "saved_models/multivariate/scaler_y.pkl"
-
-    model, scaler_x, scaler_y = load_model_and_scalers(model_file, scaler_x_path, scaler_y_path)
-
-    df = load_data()
-    df = df.sort_values("timestamp").reset_index(drop=True)
-
-    feature_cols = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
-                    'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
-    window = 10
-
-    df = add_time_features(df)
-
-    features = df[feature_cols].values
-    input_seq = features[-window:]
-
-    input_seq_scaled = scaler_x.transform(input_seq)
-    current_seq = torch.tensor(input_seq_scaled, dtype=torch.float32).unsqueeze(0).to(device)
-
-    last_timestamp = df['timestamp'].iloc[-1]
-    preds = []
-
-    for step in range(1, n_steps + 1):
-        with torch.no_grad():
-            output_scaled = model(current_seq)
-        
-        output_scaled_np = output_scaled.cpu().numpy()
-        output_np = scaler_y.inverse_transform(output_scaled_np).reshape(-1)
-
-        pred_gas = output_np[:3]
-        preds.append(pred_gas.tolist()+[last_timestamp+timedelta(minutes=step-1)])
-
-        next_time = last_timestamp + timedelta(minutes=step)
-        next_features = np.array([
-            pred_gas[0],
-            pred_gas[1],
-            pred_gas[2],
-            next_time.hour,
-            next_time.minute,
-            next_time.dayofweek,
-            next_time.day,
-            next_time.month,
-            next_time.year,
-        ]).reshape(1, 9)
-
-        next_features_scaled = scaler_x.transform(next_features).reshape(1, 1, 9)
-        next_features_tensor = torch.tensor(next_features_scaled, dtype=torch.float32).to(device)
-
-        current_seq = torch.cat([current_seq[:, 1:, :], next_features_tensor], dim=1)
-
-    results = []
-    key_priority = key if key in ['low_gas_price', 'medium_gas_price', 'high_gas_price'] else 'medium_gas_price'
-    for i, p in enumerate(preds, 1):
-        results.append({
-            "step": i,
-            "low_gas_price": float(p[0]),
-            "medium_gas_price": float(p[1]),
-            "high_gas_price": float(p[2]),
-            "timestamp": p[3]
-        })
-    
-    top_k = sorted([{"step":prices["step"], key_priority:prices[key_priority], "timestamp":prices["timestamp"]} for prices in results], key=lambda e: e[key_priority])[:5]
-
-    return {"predictions": top_k}
\ No newline at end of file
+@app.get("/backtest/ensemble")
+def backtest_ensemble(start: datetime, end: datetime, series: bool = False):
+    # Scores every block of [start, end) from the blocks before it, one batched call per model
+    ensemble = get_ensemble()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="La fin doit être postérieure au début.")
+    frame = load_history_range(unix_seconds(start), unix_seconds(end), lead=ensemble.window)
+    if len(frame) - ensemble.window > MAX_BACKTEST_ROWS:
+        raise HTTPException(status_code=400, detail=f"Plage trop grande (max {MAX_BACKTEST_ROWS} blocs).")
+    if len(frame) <= ensemble.window:
+        raise HTTPException(status_code=404, detail="Pas d'historique sur cette plage.")
+
+    times, actual, preds = ensemble.backtest(frame)
+    result = {}
+    for target, target_preds in preds.items():
+        result[target] = {
+            "rows": len(actual),
+            "metrics": {model_type: error_metrics(actual[target], values) for model_type, values in target_preds.items()},
+            **ensemble.targets[target].info(),
+        }
+        if series:
+            result[target]["series"] = {
+                "timestamp": [t.isoformat() for t in times],
+                "actual": np.round(actual[target].to_numpy(np.float64), 4).tolist(),
+                **{model_type: np.round(values.astype(np.float64), 4).tolist()
+                   for model_type, values in target_preds.items()},
+            }
+    return {"start": start, "end": end, "targets": result}
+
+@app.get("/predict/stream")
+async def stream_forecast(request: Request, n_steps: int = Query(MAX_HORIZON, ge=1, le=MAX_HORIZON),
+                          key: str = Query("medium_gas_price"), trajectory: bool = True, follow: bool = False,
+                          chain: str = DEFAULT_CHAIN, model: str = DEFAULT_MODEL):
+    # Server-sent events: the trajectory streams as it is rolled out; follow=true pushes a new
+    # forecast on every new block or model swap
+    slot = await get_slot(chain, model)
+    get_active_model(slot)
+    get_history(NEXT_STEP_WINDOW, slot)
+    return StreamingResponse(forecast_events(request, slot, n_steps, key, trajectory, follow),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
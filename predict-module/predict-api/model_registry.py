@@ -0,0 +1,183 @@
+import os
+import glob
+import json
+import pickle
+import threading
+from datetime import datetime
+
+import torch
+
+from model_utils import MultivariateLSTM, device
+from rollout import RolloutEngine
+from inference import INFERENCE_BACKEND
+from telemetry import span
+from artifact_store import ArtifactStore, load_torch_weights, load_scaler
+
+MODEL_DIR = "saved_models"
+MULTIVARIATE_DIR = os.path.join(MODEL_DIR, "multivariate")
+RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 5))
+
+
+class ActiveModel:
+    """Immutable snapshot of one training run: weights and the scalers fitted with them."""
+
+    def __init__(self, version, model, scaler_x, scaler_y, model_path, loaded_at, metadata=None,
+                 backend=INFERENCE_BACKEND):
+        self.version = version
+        self.model = model
+        self.scaler_x = scaler_x
+        self.scaler_y = scaler_y
+        self.model_path = model_path
+        self.loaded_at = loaded_at
+        self.metadata = metadata or {}
+        # Artifacts exported next to the weights are only found for artifact store versions
+        artifact_dir = model_path if os.path.isdir(model_path) else None
+        self.engine = RolloutEngine(model, scaler_x, scaler_y, backend, artifact_dir)
+
+    @property
+    def nbytes(self):
+        # Weights and buffers; exported and quantized backends hold a second copy in their runtime
+        fused = self.engine.fused
+        params = sum(t.numel() * t.element_size() for t in list(fused.parameters()) + list(fused.buffers()))
+        return params if self.engine.runner is fused else 2 * params
+
+    @property
+    def trained_at(self):
+        # Versions published in the same second get a _<n> suffix
+        return datetime.strptime(self.version[:15], "%Y%m%d_%H%M%S")
+
+    def info(self):
+        return {
+            "version": self.version,
+            "model_path": self.model_path,
+            "loaded_at": self.loaded_at.isoformat(),
+            "backend": self.engine.backend,
+            **self.metadata,
+        }
+
+
+def checkpoint_version(model_path):
+    # multivariate_lstm_YYYYmmdd_HHMMSS.pt -> YYYYmmdd_HHMMSS
+    name = os.path.basename(model_path)[:-len(".pt")]
+    return "_".join(name.split("_")[-2:])
+
+
+def latest_checkpoint(folder=MULTIVARIATE_DIR):
+    paths = sorted(glob.glob(os.path.join(folder, "multivariate_lstm_*.pt")))
+    return paths[-1] if paths else None
+
+
+def scaler_paths(model_path):
+    folder = os.path.dirname(model_path)
+    version = checkpoint_version(model_path)
+    scaler_x_path = os.path.join(folder, f"scaler_x_{version}.pkl")
+    scaler_y_path = os.path.join(folder, f"scaler_y_{version}.pkl")
+    if os.path.exists(scaler_x_path) and os.path.exists(scaler_y_path):
+        return scaler_x_path, scaler_y_path
+    # Checkpoints written before scalers were versioned only have the shared files
+    return os.path.join(folder, "scaler_x.pkl"), os.path.join(folder, "scaler_y.pkl")
+
+
+def load_metadata(model_path):
+    # rmse / last_block / mode written next to the checkpoint by save_multivariate
+    metadata_path = model_path[:-len(".pt")] + ".json"
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path) as f:
+        return json.load(f)
+
+
+def load_model_and_scalers(model_path, scaler_x_path, scaler_y_path):
+    # Sized from the weights, so checkpoints of other model configs load too
+    state = torch.load(model_path, map_location=device)
+    hidden_size, input_size = state['lstm.weight_ih_l0'].shape
+    model = MultivariateLSTM(input_size=input_size, hidden_size=hidden_size // 4).to(device)
+    model.load_state_dict(state)
+    model.eval()
+
+    with open(scaler_x_path, "rb") as f:
+        scaler_x = pickle.load(f)
+    with open(scaler_y_path, "rb") as f:
+        scaler_y = pickle.load(f)
+
+    return model, scaler_x, scaler_y
+
+
+def load_version(store, version):
+    # Artifact store layout: weights are memory-mapped and copied into the module, scalers
+    # are read as plain arrays
+    path = store.path(version)
+    manifest = store.manifest(version)
+    model = MultivariateLSTM(input_size=manifest.get("input_size", 9),
+                             hidden_size=manifest.get("hidden_size", 300)).to(device)
+    model.load_state_dict(load_torch_weights(path, device))
+    model.eval()
+    return model, load_scaler(path, "scaler_x"), load_scaler(path, "scaler_y"), manifest
+
+
+class ModelRegistry:
+    """Keeps the newest multivariate checkpoint resident and hot-swaps it when a new one appears.
+
+    Readers call ``get()`` once per request and use the returned snapshot until they are done,
+    so a swap never changes the model under an in-flight request.
+    """
+
+    def __init__(self, folder=MULTIVARIATE_DIR, reload_interval=RELOAD_INTERVAL, backend=INFERENCE_BACKEND):
+        self.folder = folder
+        self.store = ArtifactStore(folder)
+        self.reload_interval = reload_interval
+        self.backend = backend
+        self._active = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def get(self):
+        return self._active
+
+    def _latest(self):
+        # Published versions win; flat legacy checkpoints are only used when there are none
+        version = self.store.latest()
+        if version is not None:
+            return version, self.store.path(version), lambda: load_version(self.store, version)
+        model_path = latest_checkpoint(self.folder)
+        if model_path is None:
+            return None, None, None
+        def load_legacy():
+            return (*load_model_and_scalers(model_path, *scaler_paths(model_path)), load_metadata(model_path))
+        return checkpoint_version(model_path), model_path, load_legacy
+
+    def reload(self, force=False):
+        with self._lock:
+            version, model_path, load = self._latest()
+            if version is None:
+                return self._active
+            if not force and self._active is not None and self._active.version == version:
+                return self._active
+
+            # Includes building the inference backend and its agreement check
+            with span("model_load"):
+                model, scaler_x, scaler_y, metadata = load()
+                self._active = ActiveModel(version, model, scaler_x, scaler_y, model_path, datetime.utcnow(),
+                                           metadata, self.backend)
+            print(f"Loaded model {version} from {self.folder}")
+            return self._active
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Model reload failed: {e}")
+
+    def start_watching(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+
+registry = ModelRegistry()
@@ -1,30 +1,32 @@
 import os
 import math
-import joblib
 import numpy as np
 import pandas as pd
 import torch
 import torch.nn as nn
-import psycopg2
-from datetime import datetime
-from sklearn.metrics import mean_squared_error
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.neural_network import MLPRegressor
-from sklearn.preprocessing import MinMaxScaler
-from concurrent.futures import ThreadPoolExecutor
-import pickle
-
-# Database configuration
-DB_PARAMS = {
-    'dbname': os.getenv('POSTGRES_DB'),
-    'user': os.getenv('POSTGRES_USER'),
-    'password': os.getenv('POSTGRES_PASSWORD'),
-    'host': os.getenv('POSTGRES_HOST', 'localhost'),
-    'port': os.getenv('POSTGRES_PORT', 5432)
-}
+import copy
+from windowing import supervised_windows
+from db import read_frame, read_frame_async, read_frame_chunked
+from history_file import CALENDAR_COLUMNS, calendar_columns, history_file
+from rollups import Rollups, CONTEXT_HOURS, CONTEXT_MINUTES, context_blocks
+from telemetry import timed
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+MULTIVARIATE_TARGETS = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
+MULTIVARIATE_FEATURES = MULTIVARIATE_TARGETS + ['hour', 'minute', 'dayofweek', 'day', 'month', 'year']
+# Rollups in front of the recent blocks of each input window (see rollups.py)
+MULTIVARIATE_CONTEXT = {"hours": CONTEXT_HOURS, "minutes": CONTEXT_MINUTES}
+# Table training reads; other chains' tables are only served (see slots.py)
+HISTORY_TABLE = "gas_history"
+
+# Incremental retraining: rows of older history replayed alongside the new blocks, fine-tune
+# epochs, and how far (as a fraction of the fitted range) new data may leave the frozen scalers
+INCREMENTAL_REPLAY_ROWS = int(os.getenv("INCREMENTAL_REPLAY_ROWS", 2000))
+INCREMENTAL_EPOCHS = int(os.getenv("INCREMENTAL_EPOCHS", 5))
+INCREMENTAL_LR = float(os.getenv("INCREMENTAL_LR", 0.0001))
+SCALER_DRIFT_TOLERANCE = float(os.getenv("SCALER_DRIFT_TOLERANCE", 0.05))
+
 # Models
 class LSTMModel(nn.Module):
     def __init__(self, input_size=1, hidden_size=50):
@@ -50,76 +52,116 @@ class MultivariateLSTM(nn.Module):
         return self.activation(out)
 
 # Data loading and preprocessing
-def load_data():
-    conn = psycopg2.connect(**DB_PARAMS)
-    df = pd.read_sql("SELECT * FROM gas_history ORDER BY block_number ASC", conn)
-    conn.close()
-    return df
+def _load_all():
+    return read_frame_chunked("SELECT * FROM gas_history ORDER BY block_number ASC")
 
+@timed("load_data")
+def load_data():
+    # From the local history file when there is one, after appending the blocks the database
+    # has beyond it; rows come with their calendar columns in compact dtypes
+    if history_file is None:
+        return _load_all()
+    try:
+        history_file.sync(_load_all, lambda last_block: load_recent_data(after_block=last_block))
+    except Exception as e:
+        print(f"History file sync failed, training on the local copy: {e}")
+    return history_file.frame()
+
+def _recent_data_query(after_block=None, limit=None, table=HISTORY_TABLE):
+    # Either the rows newer than after_block, or the last `limit` rows, in block order. The
+    # table comes from configuration, but is interpolated, so it must be a plain identifier
+    if not table.isidentifier():
+        raise ValueError(f"Invalid history table name: {table!r}")
+    if after_block is not None:
+        return f"SELECT * FROM {table} WHERE block_number > %s ORDER BY block_number ASC", (after_block,)
+    query = f"SELECT * FROM (SELECT * FROM {table} ORDER BY block_number DESC LIMIT %s) t ORDER BY block_number ASC"
+    return query, (limit,)
+
+def load_recent_data(after_block=None, limit=None, table=HISTORY_TABLE):
+    return read_frame(*_recent_data_query(after_block, limit, table))
+
+async def load_recent_data_async(after_block=None, limit=None, table=HISTORY_TABLE):
+    return await read_frame_async(*_recent_data_query(after_block, limit, table))
+
+@timed("load_history_range")
+def load_history_range(start, end, lead=0):
+    """Rows with start <= timestamp < end (unix seconds), in block order, behind the `lead` rows
+    before start; from the history file when it covers the range."""
+    if history_file is not None:
+        df = history_file.frame_between(start, end, lead)
+        if df is not None:
+            return df
+    query = ("SELECT * FROM (SELECT * FROM gas_history WHERE timestamp < %s ORDER BY block_number DESC LIMIT %s) t "
+             "UNION ALL SELECT * FROM gas_history WHERE timestamp >= %s AND timestamp < %s ORDER BY block_number ASC")
+    return read_frame(query, (start, lead, start, end))
+
+@timed("add_time_features")
 def add_time_features(df):
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    df['hour'] = df['timestamp'].dt.hour
-    df['minute'] = df['timestamp'].dt.minute
-    df['dayofweek'] = df['timestamp'].dt.dayofweek
-    df['day'] = df['timestamp'].dt.day
-    df['month'] = df['timestamp'].dt.month
-    df['year'] = df['timestamp'].dt.year
-    return df
+    # Frames from the history file and the history store already carry the calendar columns
+    calendar = {} if all(col in df for col in CALENDAR_COLUMNS) else calendar_columns(df['timestamp'].values)
+    return df.assign(timestamp=pd.to_datetime(df['timestamp'], unit='s'), **calendar)
 
-def create_features_multivariate(df, target_col, window=10):
+def multivariate_series(df, target_col):
+    # Raw (rows, features) series and target, before any windowing
     df = add_time_features(df)
     feature_cols = ['low_gas_price', 'medium_gas_price', 'high_gas_price', 'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
-    data = df[feature_cols].values
-    target = df[target_col].values
+    return df[feature_cols].values, df[target_col].values
 
-    X, y = [], []
-    for i in range(window, len(data)):
-        X.append(data[i-window:i])
-        y.append(target[i])
-    return np.array(X), np.array(y)
+def create_features_multivariate(df, target_col, window=10):
+    data, target = multivariate_series(df, target_col)
+    return supervised_windows(data, window, target)
 
 # Model predict
 
-def predict_next(models_dict, scalers_dict, df, window: int = 10):
-    result = {}
-
-    targets = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
+def score_models(models, scalers, windows, batch_size=4096):
+    """Predictions of one target's models (see train_model_for_target_and_type) for a batch of
+    (n, window, features) raw windows, one call per model: {model_type: (n,) array}.
+
+    scalers maps model types that need them to their (scaler_x, scaler_y).
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    flat = windows.reshape(len(windows), -1)
+    preds = {}
+    for model_type, model in models.items():
+        if len(windows) == 0:
+            preds[model_type] = np.empty(0, dtype=np.float32)
+        elif model_type == 'lstm':
+            # Trained on raw windows and targets, no scalers
+            with torch.inference_mode():
+                preds[model_type] = np.concatenate([
+                    model(torch.tensor(windows[i:i + batch_size], device=device)).cpu().numpy().ravel()
+                    for i in range(0, len(windows), batch_size)])
+        elif model_type in scalers:
+            scaler_x, scaler_y = scalers[model_type]
+            preds[model_type] = scaler_y.inverse_transform(model.predict(scaler_x.transform(flat)).reshape(-1, 1)).ravel()
+        else:
+            preds[model_type] = model.predict(flat)
+    return preds
 
-    for target in targets:
-        # Extract windowed features for this target
-        window_vals = df[target].values[-window:]
-        x_input = window_vals.reshape(1, -1)
-
-        # Scale input
-        scaler_x = scalers_dict[target]['scaler_x']
-        scaler_y = scalers_dict[target]['scaler_y']
-        x_scaled = scaler_x.transform(x_input)
-
-        # Models
-        mlp = models_dict[target]['mlp']
-        rf = models_dict[target]['random_forest']
-        lstm = models_dict[target]['lstm']
-
-        # Predictions
-        mlp_pred = scaler_y.inverse_transform(mlp.predict(x_scaled).reshape(-1, 1))[0][0]
-        rf_pred = rf.predict(x_input)[0]
-
-        lstm_input = torch.tensor(x_input.reshape(1, window, 1), dtype=torch.float32)
-        lstm_out = lstm(lstm_input).detach().numpy().ravel()[0]
-        lstm_pred = scaler_y.inverse_transform([[lstm_out]])[0][0]
-
-        result[target] = {
-            "random_forest": round(float(rf_pred), 4),
-            "mlp": round(float(mlp_pred), 4),
-            "lstm": round(float(lstm_pred), 4)
-        }
+def predict_next(models_dict, scalers_dict, df, window: int = 10):
+    """Each per-target model's prediction for the row after df: {target: {model_type: value}}.
 
+    scalers_dict[target] holds the MLP's scaler_x / scaler_y.
+    """
+    data, _ = multivariate_series(df.iloc[-window:], MULTIVARIATE_TARGETS)
+    result = {}
+    for target in MULTIVARIATE_TARGETS:
+        scalers = {'mlp': (scalers_dict[target]['scaler_x'], scalers_dict[target]['scaler_y'])}
+        preds = score_models(models_dict[target], scalers, data[np.newaxis])
+        result[target] = {model_type: round(float(pred[0]), 4) for model_type, pred in preds.items()}
     return result
 
 
 # Model training
-def train_model_for_target_and_type(df, target_col, model_type):
+def train_model_for_target_and_type(df, target_col, model_type, n_jobs=None, epochs=50):
+    # sklearn and the training loop are imported by the training paths only: serving never
+    # loads them (see main.py)
+    from sklearn.metrics import mean_squared_error
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.preprocessing import MinMaxScaler
+    from training import split_windows, fit, predict_dataset
+
     X, y = create_features_multivariate(df, target_col)
     split = int(len(X) * 0.8)
     X_train, y_train = X[:split], y[:split]
@@ -148,32 +190,19 @@ def train_model_for_target_and_type(df, target_col, model_type):
         rmse = math.sqrt(mean_squared_error(y_test, preds))
 
     elif model_type == 'random_forest':
-        model = RandomForestRegressor(n_estimators=100)
+        model = RandomForestRegressor(n_estimators=100, n_jobs=n_jobs)
         model.fit(X_train_flat, y_train)
         preds = model.predict(X_test_flat)
         rmse = math.sqrt(mean_squared_error(y_test, preds))
 
     elif model_type == 'lstm':
-        num_features = X.shape[2]
-        model = LSTMModel(input_size=num_features, hidden_size=50).to(device)
-        loss_fn = torch.nn.MSELoss()
-        optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-
-        X_train_lstm = torch.tensor(X_train, dtype=torch.float32).to(device)
-        y_train_lstm = torch.tensor(y_train.reshape(-1, 1), dtype=torch.float32).to(device)
-        X_test_lstm = torch.tensor(X_test, dtype=torch.float32).to(device)
-
-        for epoch in range(50):
-            model.train()
-            output = model(X_train_lstm)
-            loss = loss_fn(output, y_train_lstm)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-
-        model.eval()
-        with torch.no_grad():
-            preds = model(X_test_lstm).cpu().detach().numpy().ravel()
+        # Windows are gathered per batch from the raw series instead of the stacked X above
+        data, target = multivariate_series(df, target_col)
+        train_set, test_set = split_windows(data, target, window=X.shape[1])
+        model = LSTMModel(input_size=X.shape[2], hidden_size=50).to(device)
+        fit(model, torch.nn.MSELoss(), train_set, test_set, epochs=epochs, device=device, name=f"lstm/{target_col}")
+
+        preds = predict_dataset(model, test_set, device=device).ravel()
         rmse = math.sqrt(mean_squared_error(y_test, preds))
 
     return {
@@ -185,135 +214,250 @@ def train_model_for_target_and_type(df, target_col, model_type):
         'rmse': rmse
     }
 
-def save_models(mlp=None, rf=None, lstm=None, multivariate_lstm=None, folder="saved_models"):
-    os.makedirs(folder, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    if mlp:
-        joblib.dump(mlp, f"{folder}/mlp_{timestamp}.pkl")
-    if rf:      
-        joblib.dump(rf, f"{folder}/rf_{timestamp}.pkl")
-    if lstm:
-        torch.save(lstm.state_dict(), f"{folder}/lstm_{timestamp}.pt")
-    if multivariate_lstm:
-        torch.save(multivariate_lstm.state_dict(), f"{folder}/multivariate_lstm_{timestamp}.pt")
-
-def create_features_multivariate_full(df, feature_cols, target_cols, window=10):
-    df = add_time_features(df)
-    data = df[feature_cols].values
-    target = df[target_cols].values
-    X, y = [], []
-    for i in range(window, len(df)):
-        X.append(data[i-window:i])  # fenêtre glissante de features
-        y.append(target[i])         # valeur cible au temps i (prochaine étape)
-    return np.array(X), np.array(y)
-
-def train_models(): 
-    df = load_data()
-    targets = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
-    model_types = ['mlp', 'random_forest', 'lstm']
-    results = {}
+@timed("publish_target_models")
+def save_target_models(target, models, window=10, root="saved_models"):
+    """Publish the per-target models of one training run as a single artifact version."""
+    import joblib
+    from artifact_store import ArtifactStore, save_torch_weights, save_scalers
+
+    def write(tmp_dir):
+        for model_type, res in models.items():
+            if model_type == 'lstm':
+                save_torch_weights(tmp_dir, res['model'], name="lstm.pt")
+            else:
+                # Uncompressed, so the forest arrays can be memory-mapped on load
+                joblib.dump(res['model'], os.path.join(tmp_dir, f"{model_type}.joblib"))
+            if res.get('scaler_x') is not None:
+                save_scalers(tmp_dir, **{f"{model_type}_scaler_x": res['scaler_x'],
+                                         f"{model_type}_scaler_y": res['scaler_y']})
+
+    manifest = {
+        "target": target,
+        "window": window,
+        "feature_cols": MULTIVARIATE_FEATURES,
+        "models": {model_type: {"rmse": res['rmse'], **({"timing": res['timing']} if 'timing' in res else {})}
+                   for model_type, res in models.items()},
+    }
+    return ArtifactStore(os.path.join(root, target)).publish(write, manifest)
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(train_model_for_target_and_type, df, t, m) for t in targets for m in model_types]
-        for future in futures:
-            res = future.result()
-            target = res['target']
-            model_type = res['model_type']
-            if target not in results:
-                results[target] = {}
-            results[target][model_type] = {
-                'model': res['model'],
-                'scaler_x': res['scaler_x'],
-                'scaler_y': res['scaler_y'],
-                'rmse': res['rmse']
-            }
-            save_models(
-                mlp=res['model'] if model_type == 'mlp' else None,
-                rf=res['model'] if model_type == 'random_forest' else None,
-                lstm=res['model'] if model_type == 'lstm' else None,
-                folder=f"saved_models/{target}"
-            )
-    
-    feature_cols = ['low_gas_price', 'medium_gas_price', 'high_gas_price',
-                    'hour', 'minute', 'dayofweek', 'day', 'month', 'year']
+def multivariate_loss(y_pred, y_true):
+    base_loss = nn.MSELoss()(y_pred, y_true)
 
-    window = 10
+    # Pénalise les ordres incorrects
+    order_penalty = torch.mean(torch.relu(y_pred[:, 0] - y_pred[:, 1]) +
+                            torch.relu(y_pred[:, 1] - y_pred[:, 2]))
 
-    df = add_time_features(df)
+    # Pénalise les valeurs négatives
+    neg_penalty = torch.mean(torch.relu(-y_pred))
 
-    X_seq, y_seq = create_features_multivariate_full(df, feature_cols, targets, window)
-    scaler_x = MinMaxScaler()
-    X_seq_2d = X_seq.reshape(-1, X_seq.shape[2])
-    X_seq_scaled_2d = scaler_x.fit_transform(X_seq_2d)
-    X_seq_scaled = X_seq_scaled_2d.reshape(X_seq.shape)
+    return base_loss + 10 * order_penalty + 10 * neg_penalty
 
-    scaler_y = MinMaxScaler()
-    y_seq_scaled = scaler_y.fit_transform(y_seq)
+def create_features_multivariate_full(df, feature_cols, target_cols, window=10):
+    df = add_time_features(df)
+    return supervised_windows(df[feature_cols].values, window, df[target_cols].values)
+
+def rollup_context(df, scaler_x, context):
+    """Scaled rollup rows in front of the windows ending at given rows of df, as a per-batch
+    callable for split_windows; None when the context is empty."""
+    if not context or not any(context.values()):
+        return None
+    seconds = df['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+    rollups = Rollups(minutes=None, hours=None)
+    rollups.append(seconds, df[MULTIVARIATE_TARGETS].values)
+    return lambda last_rows: rollups.context(seconds[last_rows], **context) * scaler_x.scale_ + scaler_x.min_
+
+def residual_scale(actual, preds):
+    # Per-price std of log(actual / predicted) one step ahead: the noise probabilistic
+    # forecasts sample at each step (see RolloutEngine.sample)
+    ratio = np.log(np.maximum(actual, 1e-9) / np.maximum(preds, 1e-9))
+    return [round(float(value), 6) for value in ratio.std(axis=0)]
+
+def train_multivariate(df, window=10, epochs=80, context=MULTIVARIATE_CONTEXT):
+    from sklearn.metrics import mean_squared_error
+    from sklearn.preprocessing import MinMaxScaler
+    from training import split_windows, fit, predict_dataset
+
+    targets = MULTIVARIATE_TARGETS
+    feature_cols = MULTIVARIATE_FEATURES
 
-    split = int(len(X_seq) * 0.8)
-    X_train, X_test = X_seq_scaled[:split], X_seq_scaled[split:]
-    y_train, y_test = y_seq_scaled[:split], y_seq_scaled[split:]
+    df = add_time_features(df)
 
-    X_train_t = torch.tensor(X_train, dtype=torch.float32).to(device)
-    y_train_t = torch.tensor(y_train, dtype=torch.float32).to(device)
-    X_test_t = torch.tensor(X_test, dtype=torch.float32).to(device)
-    y_test_t = torch.tensor(y_test, dtype=torch.float32).to(device)
+    # Every row but the last appears in some input window, so fitting on the series gives the
+    # same scaler as fitting on the stacked windows
+    data = df[feature_cols].values.astype(np.float32)
+    target = df[targets].values.astype(np.float32)
+    scaler_x = MinMaxScaler().fit(data[:-1])
+    scaler_y = MinMaxScaler().fit(target[window:])
 
-    model = MultivariateLSTM(input_size=X_train.shape[2], hidden_size=300).to(device)
-    # loss_fn = nn.MSELoss()
+    train_set, test_set = split_windows(scaler_x.transform(data), scaler_y.transform(target), window,
+                                        context=rollup_context(df, scaler_x, context))
 
-    def custom_loss(y_pred, y_true):
-        base_loss = nn.MSELoss()(y_pred, y_true)
+    model = MultivariateLSTM(input_size=data.shape[1], hidden_size=300).to(device)
+    fit(model, multivariate_loss, train_set, test_set, epochs=epochs, device=device, name="multivariate")
 
-        # Pénalise les ordres incorrects
-        order_penalty = torch.mean(torch.relu(y_pred[:, 0] - y_pred[:, 1]) +
-                                torch.relu(y_pred[:, 1] - y_pred[:, 2]))
+    preds = scaler_y.inverse_transform(predict_dataset(model, test_set, device=device))
+    y_test_orig = target[test_set.start + window:test_set.stop + window]
 
-        # Pénalise les valeurs négatives
-        neg_penalty = torch.mean(torch.relu(-y_pred))
+    rmse = math.sqrt(mean_squared_error(y_test_orig, preds))
 
-        return base_loss + 10 * order_penalty + 10 * neg_penalty
-    
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-
-    epochs = 80
-    for epoch in range(epochs):
-        model.train()
-        optimizer.zero_grad()
-        output = model(X_train_t)
-        loss = custom_loss(output, y_train_t) #loss_fn(output, y_train_t)
-        loss.backward()
-        optimizer.step()
-
-        if (epoch + 1) % 10 == 0 or epoch == 0:
-            model.eval()
-            with torch.no_grad():
-                val_preds = model(X_test_t)
-                val_loss = custom_loss(val_preds, y_test_t) #loss_fn(val_preds, y_test_t)
-            print(f"Epoch {epoch+1}/{epochs} - Train Loss: {loss.item():.4f} - Val Loss: {val_loss.item():.4f}")
-
-    model.eval()
-    with torch.no_grad():
-        preds_scaled = model(X_test_t).cpu().numpy()
-    preds = scaler_y.inverse_transform(preds_scaled)
-    y_test_orig = scaler_y.inverse_transform(y_test)
+    return {
+        'target': 'multivariate',
+        'model_type': 'lstm',
+        'model': model,
+        'scaler_x': scaler_x,
+        'scaler_y': scaler_y,
+        'rmse': rmse,
+        'residual_scale': residual_scale(y_test_orig, preds),
+        'last_block': int(df['block_number'].iloc[-1]),
+        'window': window,
+        'feature_cols': feature_cols,
+        'target_cols': targets,
+        'context': context,
+        'mode': 'full'
+    }
 
-    rmse = math.sqrt(mean_squared_error(y_test_orig, preds))
+def scalers_cover(scaler_x, scaler_y, data, target, tolerance=SCALER_DRIFT_TOLERANCE):
+    # True while new prices stay within the fitted min/max (plus tolerance), i.e. the frozen
+    # scalers still map them to roughly [0, 1] and the warm-started weights remain meaningful.
+    # Calendar columns are left out: every new day, month or year leaves their fitted range.
+    prices = [MULTIVARIATE_FEATURES.index(col) for col in MULTIVARIATE_TARGETS]
+    for scaler, values, columns in ((scaler_x, data, prices), (scaler_y, target, slice(None))):
+        low, high = scaler.data_min_[columns], scaler.data_max_[columns]
+        margin = tolerance * scaler.data_range_[columns]
+        values = values[:, columns]
+        if np.any(values.min(axis=0) < low - margin) or np.any(values.max(axis=0) > high + margin):
+            return False
+    return True
+
+@timed("train_incremental")
+def train_multivariate_incremental(base_model, scaler_x, scaler_y, last_block, window=10,
+                                   replay_rows=INCREMENTAL_REPLAY_ROWS, epochs=INCREMENTAL_EPOCHS, on_epoch=None,
+                                   context=None):
+    """Fine-tune a copy of base_model on the blocks after last_block plus a bounded replay of
+    the rows before them. Scalers and the rollup context stay those of the base model.
+
+    Returns a result with mode 'up_to_date' when there is nothing new, and None when the new
+    prices have drifted out of the scalers' range (a full retrain is needed then)."""
+    from sklearn.metrics import mean_squared_error
+    from training import split_windows, fit, predict_dataset
+
+    new_rows = load_recent_data(after_block=last_block)
+    if len(new_rows) == 0:
+        return {'target': 'multivariate', 'mode': 'up_to_date', 'last_block': last_block, 'new_rows': 0}
+    # Older rows only feed the rollups of the first windows
+    df = load_recent_data(limit=len(new_rows) + replay_rows + window + context_blocks(context))
+    first = max(len(df) - len(new_rows) - replay_rows - window, 0)
+
+    targets = MULTIVARIATE_TARGETS
+    feature_cols = MULTIVARIATE_FEATURES
+    df = add_time_features(df)
+    data = df[feature_cols].values.astype(np.float32)
+    target = df[targets].values.astype(np.float32)
+    if not scalers_cover(scaler_x, scaler_y, data[-len(new_rows):], target[-len(new_rows):]):
+        print("New blocks fall outside the frozen scalers, incremental retrain skipped")
+        return None
+
+    data_scaled, target_scaled = scaler_x.transform(data), scaler_y.transform(target)
+    # Validate on the newest windows only when there are enough of them to mean something
+    train_fraction = 0.8 if len(new_rows) >= 50 else 1.0
+    train_set, test_set = split_windows(data_scaled, target_scaled, window, train_fraction,
+                                        context=rollup_context(df, scaler_x, context), first=first)
+    eval_set = test_set if len(test_set) else train_set
+
+    model = copy.deepcopy(base_model).to(device)
+    fit(model, multivariate_loss, train_set, test_set, epochs=epochs, lr=INCREMENTAL_LR,
+        patience=0 if not len(test_set) else max(1, epochs // 2), device=device, name="multivariate/incremental",
+        on_epoch=on_epoch)
+
+    preds = scaler_y.inverse_transform(predict_dataset(model, eval_set, device=device))
+    y_eval = target[eval_set.start + window:eval_set.stop + window]
+    rmse = math.sqrt(mean_squared_error(y_eval, preds))
 
-    results['multivariate'] = {
-        'model_type': model_type,
+    return {
+        'target': 'multivariate',
+        'model_type': 'lstm',
         'model': model,
-        'rmse': rmse
+        'scaler_x': scaler_x,
+        'scaler_y': scaler_y,
+        'rmse': rmse,
+        'residual_scale': residual_scale(y_eval, preds),
+        'last_block': int(df['block_number'].iloc[-1]),
+        'window': window,
+        'feature_cols': feature_cols,
+        'target_cols': targets,
+        'context': context,
+        'mode': 'incremental',
+        'new_rows': len(new_rows)
     }
-    save_dir = "saved_models/multivariate"
-    with open(os.path.join(save_dir, "scaler_x.pkl"), "wb") as f:
-        pickle.dump(scaler_x, f)
-    with open(os.path.join(save_dir, "scaler_y.pkl"), "wb") as f:
-        pickle.dump(scaler_y, f)
-
-    save_models(
-        multivariate_lstm=model,
-        folder=save_dir
-    )
-
-    return results
\ No newline at end of file
+
+@timed("publish_model")
+def save_multivariate(res, save_dir="saved_models/multivariate"):
+    """Publish weights, scalers, exported inference graphs and a manifest as one version;
+    returns the version name."""
+    from artifact_store import ArtifactStore, save_torch_weights, save_scalers
+    from rollout import FusedRollout
+    from inference import export_artifacts
+
+    def write(tmp_dir):
+        save_torch_weights(tmp_dir, res['model'])
+        save_scalers(tmp_dir, scaler_x=res['scaler_x'], scaler_y=res['scaler_y'])
+        export_artifacts(FusedRollout(res['model'], res['scaler_x'], res['scaler_y']), tmp_dir)
+
+    manifest = {
+        "metrics": {"rmse": res['rmse']},
+        "window": res.get('window', 10),
+        "feature_cols": res.get('feature_cols', MULTIVARIATE_FEATURES),
+        "target_cols": res.get('target_cols', MULTIVARIATE_TARGETS),
+        "input_size": res['model'].lstm.input_size,
+        "hidden_size": res['model'].lstm.hidden_size,
+        **{key: res[key] for key in ('context', 'last_block', 'mode', 'new_rows', 'residual_scale') if key in res},
+    }
+    return ArtifactStore(save_dir).publish(write, manifest)
+
+def train_models(progress=None):
+    # progress(fraction, message) is called as jobs finish and may raise to cancel the run
+    from orchestrator import run_training_jobs
+
+    df = load_data()
+    targets = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
+    model_types = ['mlp', 'random_forest', 'lstm']
+    results = {}
+
+    def collect(job, res, done, total):
+        if progress:
+            progress(done / total, f"trained {job['target']}/{job['model_type']}")
+        if job['model_type'] == 'multivariate':
+            res['version'] = save_multivariate(res)
+            results['multivariate'] = res
+            return
+        target = res['target']
+        model_type = res['model_type']
+        if target not in results:
+            results[target] = {}
+        results[target][model_type] = {
+            'model': res['model'],
+            'scaler_x': res['scaler_x'],
+            'scaler_y': res['scaler_y'],
+            'rmse': res['rmse'],
+            'timing': res['timing']
+        }
+        # A target is published once all of its model types are in, as one version
+        if len(results[target]) == len(model_types):
+            save_target_models(target, results[target])
+
+    run_training_jobs(df, targets, model_types, on_result=collect)
+    return results
+
+def retrain_incremental(active, progress=None):
+    """Warm-start the multivariate model from the active checkpoint and publish it; None if a
+    full retrain is needed, mode 'up_to_date' (nothing published) if there are no new blocks."""
+    if active is None or active.metadata.get('last_block') is None:
+        return None
+    on_epoch = (lambda epoch, epochs, stats: progress(epoch / epochs, f"epoch {epoch}/{epochs}")) if progress else None
+    res = train_multivariate_incremental(active.model, active.scaler_x, active.scaler_y,
+                                         active.metadata['last_block'], window=active.metadata.get('window', 10),
+                                         on_epoch=on_epoch, context=active.metadata.get('context'))
+    if res is None or res['mode'] == 'up_to_date':
+        return res
+    res['version'] = save_multivariate(res)
+    return res
@@ -0,0 +1,137 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from telemetry import TRAIN_JOB_SECONDS, TRAIN_JOB_CPU_UTILIZATION
+
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", 0))  # 0 = one per core, capped by the job count
+# Threads given to the multivariate LSTM, the longest job; the others split what is left
+TRAIN_MULTIVARIATE_THREADS = int(os.getenv("TRAIN_MULTIVARIATE_THREADS", 0))
+
+
+class SharedFrame:
+    """Numeric DataFrame copied once into shared memory and re-opened without copying in workers."""
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        values = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+        self.shape = values.shape
+        self._shm = SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(self.shape, dtype=np.float64, buffer=self._shm.buf)[:] = values
+        self.name = self._shm.name
+
+    def handle(self):
+        return self.name, self.shape, self.columns
+
+    def release(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _attach(handle):
+    name, shape, columns = handle
+    shm = SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    values.flags.writeable = False
+    return shm, pd.DataFrame(values, columns=columns, copy=False)
+
+
+def limit_threads(threads):
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def _run_job(handle, job):
+    # Runs in a worker process: attach to the shared frame, train under the job's CPU budget
+    from model_utils import train_model_for_target_and_type, train_multivariate
+
+    limit_threads(job["threads"])
+    shm, df = _attach(handle)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        if job["model_type"] == "multivariate":
+            result = train_multivariate(df)
+        else:
+            result = train_model_for_target_and_type(df, job["target"], job["model_type"], n_jobs=job["threads"])
+    finally:
+        del df
+        try:
+            shm.close()
+        except BufferError:
+            pass
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    model = result.get("model")
+    if hasattr(model, "cpu"):
+        result["model"] = model.cpu()
+    result["timing"] = {
+        "threads": job["threads"],
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "cpu_utilization": round(cpu / wall / job["threads"], 3) if wall else None,
+    }
+    return job, result
+
+
+def plan_jobs(targets, model_types, cpus=None):
+    """Job list with a thread budget each: the multivariate LSTM gets the largest share."""
+    cpus = cpus or os.cpu_count() or 1
+    jobs = [{"target": "multivariate", "model_type": "multivariate"}]
+    jobs += [{"target": t, "model_type": m} for t in targets for m in model_types]
+    workers = min(TRAIN_WORKERS or cpus, len(jobs))
+
+    if workers == 1:
+        multivariate_threads = other_threads = cpus
+    else:
+        multivariate_threads = TRAIN_MULTIVARIATE_THREADS or max(1, cpus // 2)
+        other_threads = max(1, (cpus - multivariate_threads) // (workers - 1))
+    for job in jobs:
+        job["threads"] = multivariate_threads if job["model_type"] == "multivariate" else other_threads
+    return jobs, workers
+
+
+def run_training_jobs(df, targets, model_types, on_result=None):
+    """Train every job in a process pool.
+
+    on_result(job, result, done, total) runs in the parent as jobs finish; raising from it
+    cancels the jobs still pending.
+    """
+    jobs, workers = plan_jobs(targets, model_types)
+    shared = SharedFrame(df)
+    wall_start = time.perf_counter()
+    results = []
+    try:
+        # spawn: forking a process that already runs torch/BLAS threads is not safe
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [executor.submit(_run_job, shared.handle(), job) for job in jobs]
+            for future in as_completed(futures):
+                job, result = future.result()
+                timing = result["timing"]
+                print(f"Trained {job['target']}/{job['model_type']} in {timing['wall_s']}s "
+                      f"({timing['cpu_s']}s CPU on {timing['threads']} threads)")
+                TRAIN_JOB_SECONDS.labels(job["target"], job["model_type"]).observe(timing["wall_s"])
+                if timing["cpu_utilization"] is not None:
+                    TRAIN_JOB_CPU_UTILIZATION.labels(job["target"], job["model_type"]).set(timing["cpu_utilization"])
+                results.append((job, result))
+                if on_result:
+                    on_result(job, result, len(results), len(jobs))
+        except BaseException:
+            # A failed job or a cancelled retrain: drop the jobs that have not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+    finally:
+        shared.release()
+    print(f"Training finished in {time.perf_counter() - wall_start:.1f}s with {workers} workers")
+    return results
@@ -0,0 +1,155 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+from inference import select_runner
+from telemetry import ROLLOUTS, ROLLOUT_STEPS, span
+
+PRICE_FEATURES = 3
+
+
+def calendar_features(start, n_steps, freq="1min"):
+    """Timestamps start, start+freq, ... and their hour/minute/dayofweek/day/month/year columns."""
+    times = pd.date_range(pd.Timestamp(start), periods=n_steps, freq=freq)
+    calendar = np.stack([times.hour, times.minute, times.dayofweek, times.day, times.month, times.year], axis=1)
+    return times, calendar.astype(np.float32)
+
+
+class FusedRollout(nn.Module):
+    """``MultivariateLSTM`` with its MinMax scalers folded in as buffers: raw features in,
+    prices out.
+
+    ``encode`` runs the context window once, ``step`` feeds one predicted row and carries
+    ``(h, c)`` forward. Written to be scriptable and exportable, so every backend runs the
+    same graph.
+    """
+
+    def __init__(self, model, scaler_x, scaler_y):
+        super().__init__()
+        self.lstm = model.lstm
+        self.fc = model.fc
+        self.activation = model.activation
+        device = next(model.parameters()).device
+
+        def buffer(values):
+            return torch.as_tensor(np.asarray(values, dtype=np.float32), device=device)
+
+        # MinMaxScaler: x_scaled = x * scale_ + min_
+        self.register_buffer("x_scale", buffer(scaler_x.scale_))
+        self.register_buffer("x_min", buffer(scaler_x.min_))
+        self.register_buffer("y_scale", buffer(scaler_y.scale_))
+        self.register_buffer("y_min", buffer(scaler_y.min_))
+
+    def _head(self, last):
+        return (self.activation(self.fc(last)) - self.y_min) / self.y_scale
+
+    @torch.jit.export
+    def encode(self, window: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        out, (h, c) = self.lstm(window * self.x_scale + self.x_min)
+        return self._head(out[:, -1]), h, c
+
+    @torch.jit.export
+    def step(self, gas: torch.Tensor, calendar: torch.Tensor, h: torch.Tensor,
+             c: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        x = (torch.cat([gas, calendar], dim=1) * self.x_scale + self.x_min).unsqueeze(1)
+        out, (h, c) = self.lstm(x, (h, c))
+        return self._head(out[:, -1]), h, c
+
+    def forward(self, window: torch.Tensor, calendar: torch.Tensor) -> torch.Tensor:
+        gas, h, c = self.encode(window)
+        calendar = calendar.expand(gas.shape[0], -1, -1)
+        preds = [gas]
+        for step in range(calendar.shape[1]):
+            gas, h, c = self.step(gas, calendar[:, step], h, c)
+            preds.append(gas)
+        return torch.stack(preds, dim=1)
+
+
+class RolloutEngine:
+    """Autoregressive multi-step forecaster for ``MultivariateLSTM``.
+
+    The context window is run through the LSTM once. Each further step feeds only the new row
+    and carries ``(h, c)`` forward. The rollout itself is a ``FusedRollout`` run by the
+    configured inference backend (see ``inference.py``).
+    """
+
+    def __init__(self, model, scaler_x, scaler_y, backend="eager", artifact_dir=None):
+        self.fused = FusedRollout(model, scaler_x, scaler_y).eval()
+        self.runner, self.backend = select_runner(self.fused, backend, artifact_dir)
+        # Exported and quantized backends are CPU-only
+        self.device = self.fused.x_scale.device if self.runner is self.fused else torch.device("cpu")
+
+    def rollout(self, window, calendar):
+        """window: (batch, rows, features) raw inputs. calendar: (batch or 1, n_steps - 1, 6) raw
+        calendar features of the rows fed back after each step. Returns (batch, n_steps, 3) prices.
+        """
+        window = torch.as_tensor(np.asarray(window, dtype=np.float32), device=self.device)
+        calendar = torch.as_tensor(np.asarray(calendar, dtype=np.float32), device=self.device)
+        with span("rollout"), torch.inference_mode():
+            preds = self.runner(window, calendar)
+        ROLLOUTS.labels(self.backend["name"]).inc()
+        ROLLOUT_STEPS.labels(self.backend["name"]).inc(preds.shape[0] * preds.shape[1])
+        return preds.cpu().numpy() if torch.is_tensor(preds) else preds
+
+    def stream(self, window, last_time, n_steps, chunk):
+        """forecast() in chunks: yields (timestamps, (<= chunk, 3) prices) as steps are computed,
+        carrying (h, c) between chunks."""
+        times, calendar = calendar_features(last_time, n_steps + 1)
+        calendar = torch.as_tensor(calendar[np.newaxis, 1:n_steps], device=self.device)
+        window = torch.as_tensor(np.asarray(window, dtype=np.float32)[np.newaxis], device=self.device)
+        with torch.inference_mode():
+            gas, h, c = self.runner.encode(window)
+        for begin in range(0, n_steps, chunk):
+            end = min(begin + chunk, n_steps)
+            rows = []
+            with span("rollout_stream"), torch.inference_mode():
+                for step in range(begin, end):
+                    if step > 0:
+                        gas, h, c = self.runner.step(gas, calendar[:, step - 1], h, c)
+                    rows.append(gas)
+            ROLLOUT_STEPS.labels(self.backend["name"]).inc(end - begin)
+            yield times[begin:end], torch.cat(rows).cpu().numpy()
+
+    def sample(self, window, last_time, n_steps, n_samples, scale, seed=0):
+        """forecast() for n_samples trajectories at once, as one batch: each step's prices are
+        multiplied by log-normal noise of the given per-price scale before being fed back.
+
+        The window is encoded once and its state broadcast to the samples, so a step costs one
+        batched LSTM step whatever n_samples is. Noise is drawn step by step from a generator
+        seeded with seed, so the first steps of a longer run are those of a shorter one.
+        Returns (timestamps, (n_steps, n_samples, 3) prices).
+        """
+        times, calendar = calendar_features(last_time, n_steps + 1)
+        calendar = torch.as_tensor(calendar[1:n_steps], device=self.device)
+        window = torch.as_tensor(np.asarray(window, dtype=np.float32)[np.newaxis], device=self.device)
+        scale = torch.as_tensor(np.asarray(scale, dtype=np.float32), device=self.device)
+        generator = torch.Generator(device=self.device).manual_seed(int(seed))
+        rows = []
+        with span("rollout_sample"), torch.inference_mode():
+            gas, h, c = self.runner.encode(window)
+            gas = gas.expand(n_samples, -1)
+            h, c = h.expand(-1, n_samples, -1).contiguous(), c.expand(-1, n_samples, -1).contiguous()
+            for step in range(n_steps):
+                if step > 0:
+                    gas, h, c = self.runner.step(gas, calendar[step - 1].expand(n_samples, -1), h, c)
+                noise = torch.randn((n_samples, PRICE_FEATURES), generator=generator, device=self.device)
+                gas = gas * torch.exp(noise * scale)
+                rows.append(gas)
+        ROLLOUT_STEPS.labels(self.backend["name"]).inc(n_steps)
+        return times[:n_steps], torch.stack(rows).cpu().numpy()
+
+    def predict_next(self, window):
+        """One-step prediction (low, medium, high) from a (rows, features) window."""
+        return self.rollout(np.asarray(window)[np.newaxis], np.empty((1, 0, 6), dtype=np.float32))[0, 0]
+
+    def forecast(self, window, last_time, n_steps):
+        """Forecast n_steps minutes from one (rows, features) window whose first prediction is
+        stamped last_time. Returns (timestamps, (n_steps, 3) prices)."""
+        if n_steps == 0:
+            return pd.DatetimeIndex([]), np.empty((0, PRICE_FEATURES), dtype=np.float32)
+        times, calendar = calendar_features(last_time, n_steps + 1)
+        preds = self.rollout(np.asarray(window)[np.newaxis], calendar[np.newaxis, 1:n_steps])
+        return times[:n_steps], preds[0]
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from history_file import CALENDAR_COLUMNS, calendar_columns
+
+ROLLUP_STATS = ['min', 'median', 'max']
+PRICE_COLUMNS = ['low_gas_price', 'medium_gas_price', 'high_gas_price']
+# Completed hours and minutes summarized in front of the recent blocks of a model's input;
+# 0 and 0 train models on the recent blocks alone
+CONTEXT_HOURS = int(os.getenv("CONTEXT_HOURS", 12))
+CONTEXT_MINUTES = int(os.getenv("CONTEXT_MINUTES", 30))
+# Closed buckets kept by the serving rollups
+ROLLUP_MINUTES = int(os.getenv("ROLLUP_MINUTES", 1440))
+ROLLUP_HOURS = int(os.getenv("ROLLUP_HOURS", 168))
+# Mainnet slot time, to turn a context span into a number of blocks to load
+BLOCK_SECONDS = 12
+
+
+def bucket_stats(buckets, prices):
+    """Bucket ids and their (n, min/median/max, low/medium/high) stats, for rows in bucket order."""
+    if len(buckets) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(ROLLUP_STATS), len(PRICE_COLUMNS)), dtype=np.float32)
+    grouped = pd.DataFrame(prices).groupby(buckets, sort=False)
+    stats = [getattr(grouped, stat)() for stat in ROLLUP_STATS]
+    return stats[0].index.to_numpy(np.int64), np.stack([s.to_numpy(np.float32) for s in stats], axis=1)
+
+
+class Rollup:
+    """min/median/max of low/medium/high per fixed-width time bucket, updated as blocks arrive.
+
+    A bucket is closed, and its stats final, once a block of a later bucket comes in; until
+    then its rows are buffered. Only closed buckets are used as context, so a forecast never
+    sees a partial bucket.
+    """
+
+    def __init__(self, seconds, capacity=None):
+        self.seconds = seconds
+        self.capacity = capacity
+        # (bucket ids, stats) of the closed buckets, swapped as one tuple
+        self._closed = bucket_stats([], [])
+        self._open_bucket = None
+        self._open_rows = np.empty((0, len(PRICE_COLUMNS)), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._closed[0])
+
+    def append(self, timestamps, prices):
+        buckets = np.asarray(timestamps).astype(np.int64) // self.seconds
+        prices = np.asarray(prices, dtype=np.float32)
+        if self._open_bucket is not None:
+            buckets = np.concatenate([np.full(len(self._open_rows), self._open_bucket), buckets])
+            prices = np.concatenate([self._open_rows, prices])
+        if len(buckets) == 0:
+            return
+        closing = buckets < buckets[-1]
+        ids, stats = bucket_stats(buckets[closing], prices[closing])
+        self._open_bucket, self._open_rows = buckets[-1], prices[~closing]
+        if len(ids):
+            closed_ids, closed_stats = self._closed
+            ids, stats = np.concatenate([closed_ids, ids]), np.concatenate([closed_stats, stats])
+            if self.capacity:
+                ids, stats = ids[-self.capacity:], stats[-self.capacity:]
+            self._closed = (ids, stats)
+
+    def feature_rows(self, buckets):
+        """Model rows (median prices, calendar of the bucket start) for an array of bucket ids.
+
+        Buckets without blocks take the stats of the last bucket before them; buckets before
+        the first one held take its stats.
+        """
+        ids, stats = self._closed
+        if len(ids) == 0:
+            if self._open_bucket is None:
+                raise ValueError("No rollups yet")
+            ids, stats = bucket_stats(np.full(len(self._open_rows), self._open_bucket), self._open_rows)
+        buckets = np.asarray(buckets, dtype=np.int64)
+        index = np.maximum(np.searchsorted(ids, buckets, side="right") - 1, 0)
+        calendar = calendar_columns(buckets * self.seconds)
+        return np.concatenate([stats[index, ROLLUP_STATS.index('median')],
+                               np.stack([calendar[col] for col in CALENDAR_COLUMNS], axis=-1)],
+                              axis=-1, dtype=np.float32)
+
+    def rows(self, n=None):
+        """The last n closed buckets as JSON-ready dicts."""
+        ids, stats = self._closed
+        if n is not None:
+            ids, stats = ids[-n:], stats[-n:]
+        starts = pd.to_datetime(ids * self.seconds, unit="s")
+        return [{"timestamp": start.isoformat(),
+                 **{price: dict(zip(ROLLUP_STATS, map(float, stat[:, i]))) for i, price in enumerate(PRICE_COLUMNS)}}
+                for start, stat in zip(starts, stats)]
+
+
+class Rollups:
+    """Per-minute and per-hour rollups of one block stream, and the fixed-size model context
+    built from them."""
+
+    def __init__(self, minutes=ROLLUP_MINUTES, hours=ROLLUP_HOURS):
+        self.minute = Rollup(60, minutes)
+        self.hour = Rollup(3600, hours)
+
+    def append(self, timestamps, prices):
+        self.minute.append(timestamps, prices)
+        self.hour.append(timestamps, prices)
+
+    def context(self, last_timestamps, hours=CONTEXT_HOURS, minutes=CONTEXT_MINUTES):
+        """(..., hours + minutes, features) rows to put in front of model windows ending at
+        last_timestamps: the completed hours, then the completed minutes, before each of them."""
+        last = np.asarray(last_timestamps).astype(np.int64)
+        parts = []
+        for rollup, count in ((self.hour, hours), (self.minute, minutes)):
+            if count:
+                parts.append(rollup.feature_rows((last // rollup.seconds)[..., np.newaxis] - np.arange(count, 0, -1)))
+        if not parts:
+            return np.empty(last.shape + (0, len(PRICE_COLUMNS) + len(CALENDAR_COLUMNS)), dtype=np.float32)
+        return np.concatenate(parts, axis=-2)
+
+
+def context_blocks(context):
+    # Rows of history to load so the rollups cover a model's context
+    if not context:
+        return 0
+    span = max(context.get('hours', 0) * 3600, context.get('minutes', 0) * 60)
+    return (span + 3600) // BLOCK_SECONDS
@@ -0,0 +1,83 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+
+from model_registry import registry
+from history_store import history
+import forecasting
+from telemetry import timed
+
+# Extra minutes precomputed for /predict/now so it keeps hitting the cache until the next block
+NOW_HORIZON_SLACK = int(os.getenv("NOW_HORIZON_SLACK", 15))
+# A stale model would need a very long /predict/now rollout; leave that to the request path
+NOW_PRECOMPUTE_MAX_STEPS = int(os.getenv("NOW_PRECOMPUTE_MAX_STEPS", 1440))
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", 5))
+
+
+class ForecastSnapshot:
+    def __init__(self, version, last_block, next_gas_fee, times, preds, computed_at, duration):
+        self.version = version
+        self.last_block = last_block
+        self.next_gas_fee = next_gas_fee
+        self.times = times
+        self.preds = preds
+        self.computed_at = computed_at
+        self.duration = duration
+
+    def matches(self, active, frame):
+        return self.version == active.version and self.last_block == int(frame['block_number'].iloc[-1])
+
+    def info(self):
+        return {
+            "version": self.version,
+            "last_block": self.last_block,
+            "horizon": len(self.preds),
+            "computed_at": self.computed_at.isoformat(),
+            "duration_s": round(self.duration, 4),
+        }
+
+
+class ForecastScheduler:
+    """Recomputes forecasts once per new block (or model swap) and publishes them as a snapshot.
+
+    The 600-step and /predict/now trajectories go into the forecast cache under the same keys
+    the handlers use, so requests only slice precomputed arrays.
+    """
+
+    def __init__(self, horizon=forecasting.MAX_HORIZON, poll_interval=SCHEDULER_POLL_INTERVAL):
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.snapshot = None
+
+    @timed("scheduler_precompute")
+    def precompute(self, active):
+        start = time.perf_counter()
+        frame = history.frame(forecasting.NEXT_STEP_WINDOW)
+        next_gas_fee = forecasting.predict_next_gas_fee(active, frame)
+        times, preds = forecasting.forecast_next_steps(active, frame, self.horizon)
+        n_now = forecasting.steps_until_now(active) + NOW_HORIZON_SLACK
+        if n_now <= NOW_PRECOMPUTE_MAX_STEPS:
+            forecasting.forecast_until_now(active, frame, n_now)
+        self.snapshot = ForecastSnapshot(active.version, int(frame['block_number'].iloc[-1]), next_gas_fee,
+                                         times, preds, datetime.utcnow(), time.perf_counter() - start)
+        return self.snapshot
+
+    async def run(self):
+        seen_block = None
+        last_key = None
+        while True:
+            # Also wakes up periodically so a model swap without a new block is picked up
+            seen_block = await history.wait_for_block(seen_block, self.poll_interval)
+            active = registry.get()
+            if active is None or seen_block is None or (active.version, seen_block) == last_key:
+                continue
+            try:
+                snapshot = await asyncio.to_thread(self.precompute, active)
+                last_key = (snapshot.version, snapshot.last_block)
+            except Exception as e:
+                print(f"Forecast precompute failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+
+scheduler = ForecastScheduler()
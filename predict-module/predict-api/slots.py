@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+from model_registry import ModelRegistry, MODEL_DIR, registry
+from history_store import HistoryStore, HISTORY_CAPACITY, history
+from history_file import HistoryFile
+from inference import INFERENCE_BACKEND
+from model_utils import HISTORY_TABLE
+from telemetry import span
+import forecasting
+
+# The slot served when a request names no chain/model: the registry and history singletons
+DEFAULT_CHAIN = os.getenv("DEFAULT_CHAIN", "ethereum")
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "multivariate")
+# Other servable slots, as JSON {"<chain>/<model>": {...}}. Every field is optional:
+#   table             history table (gas_history_<chain>)
+#   model_dir         artifact directory (saved_models/<chain>/<model>)
+#   backend           inference backend (INFERENCE_BACKEND)
+#   history_file      local columnar history file (none)
+#   history_capacity  rows of the in-memory tail (HISTORY_CAPACITY)
+#   notify_channel    channel the ingester NOTIFYs on (the table name)
+MODEL_SLOTS = os.getenv("MODEL_SLOTS", "{}")
+# Estimated weights + history bytes that idle slots are evicted to stay under
+SLOT_MEMORY_BUDGET_MB = int(os.getenv("SLOT_MEMORY_BUDGET_MB", 1024))
+
+
+def parse_slots(spec):
+    configs = {}
+    for key, config in json.loads(spec).items():
+        chain, _, model = key.partition("/")
+        configs[(chain, model or DEFAULT_MODEL)] = config
+    return configs
+
+
+class ModelSlot:
+    """One chain and model config: its model registry, its history tail and their background tasks."""
+
+    def __init__(self, chain, model, registry, history, pinned=False):
+        self.chain = chain
+        self.model = model
+        self.registry = registry
+        self.history = history
+        # Pinned slots are never evicted
+        self.pinned = pinned
+        self.closed = False
+        # Set once start() is done; requests for the slot wait on it
+        self.ready = asyncio.Event()
+        self.last_used = time.monotonic()
+        self._refresher = None
+
+    @classmethod
+    def from_config(cls, chain, model, config):
+        table = config.get("table", f"{HISTORY_TABLE}_{chain}")
+        history_file = config.get("history_file")
+        store = HistoryStore(config.get("history_capacity", HISTORY_CAPACITY), table=table,
+                             file=HistoryFile(history_file) if history_file else None,
+                             notify_channel=config.get("notify_channel", table))
+        model_registry = ModelRegistry(config.get("model_dir", os.path.join(MODEL_DIR, chain, model)),
+                                       backend=config.get("backend", INFERENCE_BACKEND))
+        return cls(chain, model, model_registry, store)
+
+    @property
+    def nbytes(self):
+        active = self.registry.get()
+        return self.history.nbytes + (active.nbytes if active else 0)
+
+    def warm_up(self):
+        # One forecast, so the first request does not pay for the backend's first call
+        active = self.registry.get()
+        if active is not None and len(self.history):
+            forecasting.predict_next_gas_fee(active, self.history.frame(forecasting.NEXT_STEP_WINDOW),
+                                             self.history.rollups)
+
+    async def start(self):
+        """Load the weights and the history tail once (requests only read them) and warm up;
+        returns the seconds each phase took."""
+        name = f"{self.chain}/{self.model}"
+        timings = {}
+        try:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.registry.reload)
+            except Exception as e:
+                print(f"Model load failed for {name}: {e}")
+            timings["model_load"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            try:
+                await self.history.refresh_async()
+            except Exception as e:
+                print(f"Initial history load failed for {name}: {e}")
+            timings["history_load"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.warm_up)
+            except Exception as e:
+                print(f"Warm-up forecast failed for {name}: {e}")
+            timings["first_forecast"] = time.perf_counter() - started
+        finally:
+            self.ready.set()
+        self.registry.start_watching()
+        self._refresher = asyncio.create_task(self.history.run_refresher())
+        return timings
+
+    async def close(self):
+        self.closed = True
+        self.registry.stop_watching()
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+
+    def info(self):
+        active = self.registry.get()
+        return {
+            "chain": self.chain,
+            "model": self.model,
+            "table": self.history.table,
+            "model_dir": self.registry.folder,
+            "backend": self.registry.backend,
+            "version": active.version if active else None,
+            "last_block": self.history.last_block,
+            "bytes": self.nbytes,
+            "pinned": self.pinned,
+            "ready": self.ready.is_set(),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class SlotManager:
+    """Model slots by (chain, model), loaded on first request and kept in LRU order.
+
+    After a slot is loaded, the least recently used unpinned slots are closed until the
+    estimated memory of the loaded slots fits the budget again. In-flight requests keep the
+    model snapshot and history frame they already hold.
+    """
+
+    def __init__(self, default, configs=None, budget_bytes=SLOT_MEMORY_BUDGET_MB * 2 ** 20):
+        self.default = default
+        self.configs = configs or {}
+        self.budget_bytes = budget_bytes
+        self.evictions = 0
+        self._slots = OrderedDict({(default.chain, default.model): default})
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def nbytes(self):
+        return sum(slot.nbytes for slot in self._slots.values())
+
+    async def start(self):
+        return await self.default.start()
+
+    async def close(self):
+        for slot in list(self._slots.values()):
+            await slot.close()
+
+    async def get(self, chain=DEFAULT_CHAIN, model=DEFAULT_MODEL):
+        """The loaded slot for chain/model, loading it if needed; None for unknown slots."""
+        key = (chain, model)
+        slot = self._slots.get(key)
+        if slot is None:
+            if key not in self.configs:
+                return None
+            # One load at a time; requests for a slot being loaded wait for it
+            async with self._lock:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = ModelSlot.from_config(chain, model, self.configs[key])
+                    with span("slot_load"):
+                        await slot.start()
+                    self._slots[key] = slot
+                    await self._evict(keep=slot)
+        if key in self._slots:
+            self._slots.move_to_end(key)
+        slot.last_used = time.monotonic()
+        # Only the default slot can still be warming up in the background (see main.py)
+        await slot.ready.wait()
+        return slot
+
+    async def _evict(self, keep):
+        for key, slot in list(self._slots.items()):
+            if self.nbytes <= self.budget_bytes:
+                break
+            if slot.pinned or slot is keep:
+                continue
+            del self._slots[key]
+            await slot.close()
+            self.evictions += 1
+            print(f"Evicted model slot {slot.chain}/{slot.model}")
+
+    def info(self):
+        return {
+            "budget_bytes": self.budget_bytes,
+            "bytes": self.nbytes,
+            "evictions": self.evictions,
+            "loaded": [slot.info() for slot in self._slots.values()],
+            "configured": [f"{chain}/{model}" for chain, model in self.configs],
+        }
+
+
+slots = SlotManager(ModelSlot(DEFAULT_CHAIN, DEFAULT_MODEL, registry, history, pinned=True), parse_slots(MODEL_SLOTS))
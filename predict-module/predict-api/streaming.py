@@ -0,0 +1,71 @@
+import os
+import json
+
+import numpy as np
+
+from telemetry import STREAM_CLIENTS
+import forecasting
+
+# Steps per "steps" event, and seconds between keep-alive comments while following
+STREAM_CHUNK_STEPS = int(os.getenv("STREAM_CHUNK_STEPS", 25))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", 15))
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+def step_rows(times, preds, offset):
+    return [{
+        "step": offset + i + 1,
+        "timestamp": t,
+        "low_gas_price": float(p[0]),
+        "medium_gas_price": float(p[1]),
+        "high_gas_price": float(p[2]),
+    } for i, (t, p) in enumerate(zip(times, preds))]
+
+
+async def forecast_events(request, slot, n_steps, key, trajectory=True, follow=False, chunk=STREAM_CHUNK_STEPS):
+    """Server-sent events for one slot's forecast, or one per new block / model swap when following.
+
+    Each forecast is a "forecast" event (version, block, horizon), then "steps" events with the
+    trajectory as it is rolled out (when trajectory is set), then a "summary" event with the
+    cheapest steps like /predict/next_n_steps. A follow stream ends when its slot is evicted.
+    """
+    STREAM_CLIENTS.inc()
+    try:
+        while True:
+            active = slot.registry.get()
+            frame = slot.history.frame(forecasting.NEXT_STEP_WINDOW)
+            last_block = int(frame['block_number'].iloc[-1])
+            yield sse("forecast", {"version": active.version, "last_block": last_block, "n_steps": n_steps})
+
+            times, preds, done = [], [], 0
+            async for chunk_times, chunk_preds in forecasting.stream_next_steps(active, frame, n_steps, chunk,
+                                                                                   slot.history.rollups):
+                if trajectory:
+                    yield sse("steps", step_rows(chunk_times, chunk_preds, done))
+                times.extend(chunk_times)
+                preds.extend(chunk_preds)
+                done += len(chunk_preds)
+            yield sse("summary", {"last_block": last_block,
+                                  "predictions": forecasting.top_k_steps(times, np.array(preds), key)})
+            if not follow:
+                return
+            # Wait for a new block or a model swap, with keep-alives so proxies hold the connection
+            while True:
+                block = await slot.history.wait_for_block(last_block, STREAM_HEARTBEAT)
+                if slot.closed:
+                    return
+                latest = slot.registry.get()
+                if block != last_block or latest.version != active.version:
+                    break
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+    finally:
+        STREAM_CLIENTS.dec()
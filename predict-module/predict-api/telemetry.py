@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Per-request profiling: "" (off), "cprofile" or "torch". Requests opt in with ?profile=1
+DEBUG_PROFILING = os.getenv("DEBUG_PROFILING", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# From tens of microseconds (cache slices) to minutes (training)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+STAGE_SECONDS = Histogram("predict_stage_seconds", "Duration of one hot-path stage", ["stage"],
+                          buckets=STAGE_BUCKETS)
+REQUEST_SECONDS = Histogram("predict_request_seconds", "HTTP request duration", ["method", "route", "status"],
+                            buckets=STAGE_BUCKETS)
+ROLLOUT_STEPS = Counter("predict_rollout_steps_total", "Autoregressive steps rolled out (batch rows x steps)",
+                        ["backend"])
+ROLLOUTS = Counter("predict_rollouts_total", "Batched rollout calls", ["backend"])
+JOB_RUNS = Counter("predict_jobs_total", "Background jobs (retrains: kind is the mode) by final status",
+                   ["kind", "status"])
+TRAIN_JOB_SECONDS = Histogram("predict_train_job_seconds", "Wall time of one training job",
+                              ["target", "model_type"], buckets=STAGE_BUCKETS)
+TRAIN_JOB_CPU_UTILIZATION = Gauge("predict_train_job_cpu_utilization",
+                                  "CPU time / (wall time x threads) of the last training job",
+                                  ["target", "model_type"])
+
+HISTORY_ROWS = Gauge("predict_history_rows", "Rows held by the in-memory history tail")
+HISTORY_LAST_BLOCK = Gauge("predict_history_last_block", "Newest block in the history tail")
+MODEL_AGE = Gauge("predict_model_age_seconds", "Seconds since the active model was trained")
+MODEL_LOADED = Gauge("predict_model_loaded_timestamp_seconds", "When the active model was loaded")
+FORECAST_CACHE = Gauge("predict_forecast_cache", "Forecast cache counters", ["field"])
+BATCHER = Gauge("predict_batcher", "Inference batcher counters", ["field"])
+STREAM_CLIENTS = Gauge("predict_stream_clients", "Open forecast streams")
+SLOTS = Gauge("predict_model_slots", "Loaded model slots and their estimated memory", ["field"])
+STARTUP_SECONDS = Gauge("predict_startup_seconds", "Seconds spent in each startup phase", ["phase"])
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator recording each call of a sync or async function as one span."""
+    def decorate(fn):
+        histogram = STAGE_SECONDS.labels(stage)
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# Seconds per startup phase (import, model_load, history_load, first_forecast, ready), for /startup
+startup_phases = {}
+
+
+def record_startup(phase, seconds):
+    startup_phases[phase] = round(seconds, 4)
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+
+def register_gauges(history, registry, forecast_cache, batcher, slots):
+    # Read at scrape time instead of being updated on the hot path
+    HISTORY_ROWS.set_function(lambda: len(history))
+    HISTORY_LAST_BLOCK.set_function(lambda: history.last_block or 0)
+
+    def model_age():
+        active = registry.get()
+        return (datetime.utcnow() - active.trained_at).total_seconds() if active else float("nan")
+
+    def model_loaded():
+        active = registry.get()
+        return (active.loaded_at - datetime(1970, 1, 1)).total_seconds() if active else float("nan")
+
+    MODEL_AGE.set_function(model_age)
+    MODEL_LOADED.set_function(model_loaded)
+    for field in ("entries", "steps", "hits", "misses"):
+        FORECAST_CACHE.labels(field).set_function(lambda field=field: forecast_cache.stats()[field])
+    for field in ("requests", "deduplicated", "batches"):
+        BATCHER.labels(field).set_function(lambda field=field: batcher.stats()[field])
+    SLOTS.labels("loaded").set_function(lambda: len(slots))
+    SLOTS.labels("bytes").set_function(lambda: slots.nbytes)
+    SLOTS.labels("evictions").set_function(lambda: slots.evictions)
+
+
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profiled(name, mode=DEBUG_PROFILING):
+    """Profile the enclosed code with cProfile or the torch profiler; yields the output path.
+
+    One profile at a time (cProfile cannot be nested): while one runs, other requests are
+    served unprofiled and get None. cProfile only sees the event-loop thread; use "torch" to
+    see the rollouts run in worker threads.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+        prefix = os.path.join(PROFILE_DIR, f"{stamp}_{name.strip('/').replace('/', '_') or 'root'}")
+        if mode == "torch":
+            import torch
+            path = f"{prefix}.trace.json"
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as prof:
+                yield path
+            prof.export_chrome_trace(path)
+        else:
+            import cProfile
+            path = f"{prefix}.prof"
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield path
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path)
+    finally:
+        _profile_lock.release()
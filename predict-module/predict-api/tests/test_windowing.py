@@ -0,0 +1,77 @@
+"""The strided windows against the Python loops they replaced."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from windowing import sliding_windows, supervised_windows
+from model_utils import (MULTIVARIATE_FEATURES, add_time_features, create_features_multivariate,
+                         create_features_multivariate_full)
+
+
+def loop_windows(data, target, window):
+    # The loop create_features_multivariate* used before windowing.py
+    X, y = [], []
+    for i in range(window, len(data)):
+        X.append(data[i-window:i])
+        y.append(target[i])
+    return np.array(X), np.array(y)
+
+
+def gas_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    medium = 20 + rng.random(rows) * 10
+    return pd.DataFrame({
+        'block_number': np.arange(rows),
+        # 12 s blocks across a month boundary, so every calendar column changes
+        'timestamp': 1_756_684_000 + 12 * np.arange(rows) * 300,
+        'low_gas_price': medium * 0.8,
+        'medium_gas_price': medium,
+        'high_gas_price': medium * 1.3,
+    })
+
+
+@pytest.mark.parametrize("rows, window", [(50, 10), (11, 10), (10, 10), (5, 10), (30, 1)])
+def test_supervised_windows_match_loop(rows, window):
+    rng = np.random.default_rng(rows)
+    data, target = rng.random((rows, 4)), rng.random((rows, 2))
+    X, y = supervised_windows(data, window, target)
+    X_loop, y_loop = loop_windows(data, target, window)
+
+    assert X.shape == (max(rows - window, 0), window, 4)
+    assert y.shape == (max(rows - window, 0), 2)
+    if len(X_loop):
+        np.testing.assert_allclose(X, X_loop, rtol=1e-6)
+        np.testing.assert_allclose(y, y_loop, rtol=1e-6)
+    # Each window is followed by its target: y = target[window:]
+    np.testing.assert_allclose(y, target[window:].astype(np.float32))
+    if len(X):
+        np.testing.assert_allclose(X[1:, -1], data[window:-1].astype(np.float32))
+
+
+def test_sliding_windows_is_a_view():
+    data = np.random.default_rng(0).random((20, 3)).astype(np.float32)
+    windows = sliding_windows(data, 5)
+    assert windows.shape == (16, 5, 3)
+    assert np.shares_memory(windows, data)
+    for i in range(len(windows)):
+        np.testing.assert_array_equal(windows[i], data[i:i+5])
+
+
+def test_sliding_windows_one_dimensional_and_short():
+    series = np.arange(6, dtype=np.float64)
+    np.testing.assert_array_equal(sliding_windows(series, 3)[:, :, 0], [[0, 1, 2], [1, 2, 3], [2, 3, 4], [3, 4, 5]])
+    assert sliding_windows(series, 10).shape == (0, 10, 1)
+
+
+def test_create_features_multivariate_match_loop():
+    df = gas_frame(200)
+    features = create_features_multivariate(df, 'medium_gas_price', window=10)
+    full = create_features_multivariate_full(df, MULTIVARIATE_FEATURES, MULTIVARIATE_FEATURES[:3], window=10)
+
+    frame = add_time_features(df)
+    data = frame[MULTIVARIATE_FEATURES].values
+    for (X, y), target in ((features, frame['medium_gas_price'].values), (full, frame[MULTIVARIATE_FEATURES[:3]].values)):
+        X_loop, y_loop = loop_windows(data, target, 10)
+        assert X.shape == X_loop.shape and y.shape == y_loop.shape
+        np.testing.assert_allclose(X, X_loop, rtol=1e-6)
+        np.testing.assert_allclose(y, y_loop, rtol=1e-6)
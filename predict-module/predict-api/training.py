@@ -0,0 +1,154 @@
+import os
+import copy
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+
+# 0 trains on the whole set as one batch per epoch, like the original loops
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", 256))
+# Epochs without a validation improvement before stopping, 0 disables early stopping
+TRAIN_PATIENCE = int(os.getenv("TRAIN_PATIENCE", 10))
+TRAIN_LOG_EVERY = int(os.getenv("TRAIN_LOG_EVERY", 10))
+
+
+class WindowDataset(Dataset):
+    """Sliding windows over a raw (rows, features) series, built per batch on access.
+
+    Item i is (data[i:i+window], target[i+window]) for i in [start, stop). Only the series
+    is held in memory; a batch gathers its windows with one indexed read.
+    """
+
+    def __init__(self, data, target, window, start=0, stop=None):
+        self.data = torch.as_tensor(np.ascontiguousarray(data, dtype=np.float32))
+        target = torch.as_tensor(np.ascontiguousarray(target, dtype=np.float32))
+        self.target = target.unsqueeze(1) if target.dim() == 1 else target
+        self.window = window
+        n_windows = max(len(self.data) - window, 0)
+        self.start = start
+        self.stop = n_windows if stop is None else min(stop, n_windows)
+        self._offsets = torch.arange(window)
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def __getitem__(self, idx):
+        X, y = self.__getitems__([idx])
+        return X[0], y[0]
+
+    def __getitems__(self, indices):
+        starts = torch.as_tensor(indices, dtype=torch.long) + self.start
+        X = self.data[starts.unsqueeze(1) + self._offsets]
+        y = self.target[starts + self.window]
+        return X, y
+
+
+class ContextWindowDataset(WindowDataset):
+    """WindowDataset whose windows are prefixed with context(last_rows): rows summarizing the
+    history before each window (see rollups.py), gathered per batch like the windows."""
+
+    def __init__(self, data, target, window, context, start=0, stop=None):
+        super().__init__(data, target, window, start, stop)
+        self.context = context
+
+    def __getitems__(self, indices):
+        X, y = super().__getitems__(indices)
+        last_rows = np.asarray(indices, dtype=np.int64) + self.start + self.window - 1
+        prefix = torch.as_tensor(np.asarray(self.context(last_rows), dtype=np.float32))
+        return torch.cat([prefix, X], dim=1), y
+
+
+def split_windows(data, target, window, train_fraction=0.8, context=None, first=0):
+    """Chronological train/validation split over the windows of one series, from window first on.
+
+    With context set, windows are prefixed with context(last_rows) (see ContextWindowDataset).
+    """
+    def dataset(start=0, stop=None):
+        if context is None:
+            return WindowDataset(data, target, window, start, stop)
+        return ContextWindowDataset(data, target, window, context, start, stop)
+
+    full = dataset(first)
+    split = first + int(len(full) * train_fraction)
+    return dataset(first, split), dataset(split)
+
+
+def _batches(dataset, batch_size, shuffle=False):
+    # __getitems__ already returns a stacked (X, y) batch
+    return DataLoader(dataset, batch_size=batch_size or max(len(dataset), 1), shuffle=shuffle,
+                      collate_fn=lambda batch: batch)
+
+
+@torch.no_grad()
+def predict_dataset(model, dataset, batch_size=TRAIN_BATCH_SIZE, device="cpu"):
+    model.eval()
+    preds = [model(X.to(device)).cpu() for X, _ in _batches(dataset, batch_size)]
+    if not preds:
+        return np.empty((0, dataset.target.shape[1]), dtype=np.float32)
+    return torch.cat(preds).numpy()
+
+
+@torch.no_grad()
+def evaluate(model, loss_fn, dataset, batch_size=TRAIN_BATCH_SIZE, device="cpu"):
+    model.eval()
+    total, seen = 0.0, 0
+    for X, y in _batches(dataset, batch_size):
+        total += loss_fn(model(X.to(device)), y.to(device)).item() * len(X)
+        seen += len(X)
+    return total / seen if seen else float("nan")
+
+
+def fit(model, loss_fn, train_set, val_set, epochs, lr=0.001, batch_size=TRAIN_BATCH_SIZE,
+        patience=TRAIN_PATIENCE, device="cpu", name="model", optimizer=None, on_epoch=None):
+    """Mini-batch training with shuffling and early stopping on the validation loss.
+
+    Keeps the weights of the best validation epoch. on_epoch(epoch, epochs, stats) is called
+    after every epoch. Returns the per-epoch stats.
+    """
+    optimizer = optimizer or torch.optim.Adam(model.parameters(), lr=lr)
+    loader = _batches(train_set, batch_size, shuffle=True)
+    early_stopping = patience > 0 and len(val_set) > 0
+    best_loss, best_state, stale_epochs = float("inf"), None, 0
+    history = []
+
+    for epoch in range(epochs):
+        model.train()
+        start = time.perf_counter()
+        total, seen = 0.0, 0
+        for X, y in loader:
+            X, y = X.to(device), y.to(device)
+            optimizer.zero_grad()
+            loss = loss_fn(model(X), y)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(X)
+            seen += len(X)
+        elapsed = time.perf_counter() - start
+
+        stats = {
+            "epoch": epoch + 1,
+            "train_loss": total / seen if seen else float("nan"),
+            "val_loss": evaluate(model, loss_fn, val_set, batch_size, device) if len(val_set) else float("nan"),
+            "samples_per_s": seen / elapsed if elapsed else float("nan"),
+        }
+        history.append(stats)
+        if (epoch + 1) % TRAIN_LOG_EVERY == 0 or epoch == 0 or epoch == epochs - 1:
+            print(f"[{name}] Epoch {epoch+1}/{epochs} - Train Loss: {stats['train_loss']:.4f} - "
+                  f"Val Loss: {stats['val_loss']:.4f} - {stats['samples_per_s']:.0f} samples/s")
+        if on_epoch:
+            on_epoch(epoch + 1, epochs, stats)
+
+        if early_stopping:
+            if stats["val_loss"] < best_loss:
+                best_loss, best_state, stale_epochs = stats["val_loss"], copy.deepcopy(model.state_dict()), 0
+            else:
+                stale_epochs += 1
+                if stale_epochs >= patience:
+                    print(f"[{name}] Early stopping at epoch {epoch+1}, best Val Loss: {best_loss:.4f}")
+                    break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return history
@@ -0,0 +1,26 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(data, window):
+    """All length-``window`` windows of a (rows, features) array as a (n, window, features) view.
+
+    Only the float32 cast can copy, and it copies the series once, never the windows.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    if len(data) < window:
+        return np.empty((0, window, data.shape[1]), dtype=np.float32)
+    return sliding_window_view(data, window, axis=0).transpose(0, 2, 1)
+
+
+def supervised_windows(data, window, target=None):
+    """Windows ending just before each row, paired with that row's target.
+
+    X[i] = data[i:i+window] and y[i] = target[i+window], for i in range(len(data) - window).
+    """
+    X = sliding_windows(np.asarray(data)[:-1], window)
+    if target is None:
+        return X, None
+    return X, np.asarray(target, dtype=np.float32)[window:]